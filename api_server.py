@@ -5,8 +5,10 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 from pydantic import BaseModel
 from typing import Optional
+from functools import lru_cache
 import uvicorn
 import asyncio
+import time
 from wiz_control import WizLight
 
 app = FastAPI(title="Wiz Light Control API")
@@ -43,14 +45,69 @@ class LightResponse(BaseModel):
     data: Optional[dict] = None
 
 
-async def get_first_light_ip():
-    """Helper function to get the first available light's IP"""
+# Seconds a discovered light IP is reused before discovering again
+LIGHT_IP_TTL = 60.0
+# Seconds between background discovery refreshes
+DISCOVERY_INTERVAL = 30.0
+
+_ip_cache = {"ip": None, "ts": 0.0}
+_discovery_task = None
+
+
+async def refresh_light_ip():
+    """Run a discovery broadcast and store the first light's IP (None if no lights)"""
     light = WizLight()
     # run the blocking discovery call in a thread and await the result
     lights = await asyncio.get_running_loop().run_in_executor(None, light.discover)
-    if not lights:
+    if lights:
+        _ip_cache.update(ip=lights[0]["ip"], ts=time.monotonic())
+    else:
+        invalidate_light_ip()
+    return _ip_cache["ip"]
+
+
+async def get_first_light_ip():
+    """Helper function to get the first available light's IP (cached for LIGHT_IP_TTL)"""
+    if _ip_cache["ip"] and time.monotonic() - _ip_cache["ts"] < LIGHT_IP_TTL:
+        return _ip_cache["ip"]
+
+    ip = await refresh_light_ip()
+    if not ip:
         raise HTTPException(status_code=404, detail="No lights found on network")
-    return lights[0]["ip"]
+    return ip
+
+
+async def _discovery_loop():
+    """Keep the cached light IP fresh so requests never wait on discovery"""
+    while True:
+        try:
+            await refresh_light_ip()
+        except Exception:
+            pass
+        await asyncio.sleep(DISCOVERY_INTERVAL)
+
+
+@app.on_event("startup")
+async def start_discovery():
+    global _discovery_task
+    _discovery_task = asyncio.create_task(_discovery_loop())
+
+
+@app.on_event("shutdown")
+async def stop_discovery():
+    if _discovery_task is not None:
+        _discovery_task.cancel()
+
+
+def invalidate_light_ip():
+    """Forget the cached light IP so the next request discovers again"""
+    _ip_cache.update(ip=None, ts=0.0)
+
+
+@lru_cache(maxsize=32)
+def get_light(ip):
+    """Shared WizLight instance per IP"""
+    return WizLight(ip)
 
 
 @app.get("/discover", response_model=LightResponse)
@@ -58,7 +115,7 @@ async def discover_lights():
     """Discover all Wiz lights on the network"""
     try:
         light = WizLight()
-        lights = light.discover()
+        lights = await asyncio.get_running_loop().run_in_executor(None, light.discover)
         return {
             "success": True,
             "message": "Lights discovered successfully",
@@ -73,14 +130,15 @@ async def turn_on_first_light():
     """Turn on the first discovered light"""
     try:
         ip = await get_first_light_ip()
-        light = WizLight(ip)
-        result = light.set_state(True)
+        light = get_light(ip)
+        result = await light.set_state_async(True)
         return {
             "success": True,
             "message": f"Light {ip} turned on successfully",
             "data": result,
         }
     except Exception as e:
+        invalidate_light_ip()
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -89,14 +147,15 @@ async def turn_off_first_light():
     """Turn off the first discovered light"""
     try:
         ip = await get_first_light_ip()
-        light = WizLight(ip)
-        result = light.set_state(False)
+        light = get_light(ip)
+        result = await light.set_state_async(False)
         return {
             "success": True,
             "message": f"Light {ip} turned off successfully",
             "data": result,
         }
     except Exception as e:
+        invalidate_light_ip()
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -105,14 +164,15 @@ async def set_first_light_color(color: ColorRequest):
     """Set color of the first discovered light"""
     try:
         ip = await get_first_light_ip()
-        light = WizLight(ip)
-        result = light.set_color(color.r, color.g, color.b, color.brightness)
+        light = get_light(ip)
+        result = await light.set_color_async(color.r, color.g, color.b, color.brightness)
         return {
             "success": True,
             "message": f"Color set successfully for light {ip}",
             "data": result,
         }
     except Exception as e:
+        invalidate_light_ip()
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -121,14 +181,15 @@ async def get_first_light_status():
     """Get status of the first discovered light"""
     try:
         ip = await get_first_light_ip()
-        light = WizLight(ip)
-        status = light.get_state()
+        light = get_light(ip)
+        status = await light.get_state_async()
         return {
             "success": True,
             "message": "Status retrieved successfully",
             "data": status,
         }
     except Exception as e:
+        invalidate_light_ip()
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -136,8 +197,8 @@ async def get_first_light_status():
 async def get_light_status(ip: str):
     """Get status of a specific light"""
     try:
-        light = WizLight(ip)
-        status = light.get_state()
+        light = get_light(ip)
+        status = await light.get_state_async()
         return {
             "success": True,
             "message": "Status retrieved successfully",
@@ -151,8 +212,8 @@ async def get_light_status(ip: str):
 async def turn_on_light(ip: str):
     """Turn on a specific light"""
     try:
-        light = WizLight(ip)
-        result = light.set_state(True)
+        light = get_light(ip)
+        result = await light.set_state_async(True)
         return {
             "success": True,
             "message": "Light turned on successfully",
@@ -166,8 +227,8 @@ async def turn_on_light(ip: str):
 async def turn_off_light(ip: str):
     """Turn off a specific light"""
     try:
-        light = WizLight(ip)
-        result = light.set_state(False)
+        light = get_light(ip)
+        result = await light.set_state_async(False)
         return {
             "success": True,
             "message": "Light turned off successfully",
@@ -181,8 +242,8 @@ async def turn_off_light(ip: str):
 async def set_light_color(ip: str, color: ColorRequest):
     """Set color and brightness of a specific light"""
     try:
-        light = WizLight(ip)
-        result = light.set_color(color.r, color.g, color.b, color.brightness)
+        light = get_light(ip)
+        result = await light.set_color_async(color.r, color.g, color.b, color.brightness)
         return {"success": True, "message": "Color set successfully", "data": result}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -4,7 +4,145 @@ Audio analysis module for extracting frequency bands from audio signals.
 Uses FFT to split audio into bass, mids, and treble for light visualization.
 """
 
+import math
+
 import numpy as np
+from scipy.fft import rfft, rfftfreq
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional, NumPy fallbacks are used instead
+    njit = None
+
+# Frequency band edges in Hz: (low inclusive, high exclusive)
+BASS_RANGE = (20, 250)
+MIDS_RANGE = (250, 4000)
+TREBLE_RANGE = (4000, 20000)
+
+# Chunks whose peak sample is below this are treated as silence
+SILENCE_PEAK = 1e-4
+# Per-chunk decay of the smoothed bands during silence
+SILENCE_DECAY = 0.9
+
+
+def _band_means_numpy(spectrum, bounds, out=None):
+    """Mean FFT magnitude of each band, using NumPy slices (|X| written to out)."""
+    magnitude = np.abs(spectrum, out=out)
+    return tuple(
+        magnitude[lo:hi].mean() if hi > lo else 0.0
+        for lo, hi in zip(bounds[::2], bounds[1::2])
+    )
+
+
+if njit is not None:
+
+    @njit(fastmath=True, cache=True)
+    def _band_means(spectrum, bounds):
+        """Mean FFT magnitude of each band in one pass, without a |X| temporary."""
+        bass_lo, bass_hi, mids_lo, mids_hi, treble_lo, treble_hi = bounds
+
+        bass = 0.0
+        for i in range(bass_lo, bass_hi):
+            bass += abs(spectrum[i])
+        mids = 0.0
+        for i in range(mids_lo, mids_hi):
+            mids += abs(spectrum[i])
+        treble = 0.0
+        for i in range(treble_lo, treble_hi):
+            treble += abs(spectrum[i])
+
+        if bass_hi > bass_lo:
+            bass /= bass_hi - bass_lo
+        if mids_hi > mids_lo:
+            mids /= mids_hi - mids_lo
+        if treble_hi > treble_lo:
+            treble /= treble_hi - treble_lo
+        return bass, mids, treble
+
+else:
+    _band_means = None
+
+
+if njit is not None:
+
+    @njit(cache=True)
+    def _update_levels(bass, mids, treble, max_bands, smoothed, gain_decay, smoothing, keep):
+        """Auto-gain, smooth and clamp the band levels in place, in float32."""
+        bands = (np.float32(bass), np.float32(mids), np.float32(treble))
+        zero = np.float32(0.0)
+        one = np.float32(1.0)
+        for i in range(3):
+            band = bands[i]
+            peak = max(band, max_bands[i] * gain_decay)
+            max_bands[i] = peak
+            norm = band / peak if peak > zero else zero
+            level = smoothing * norm + keep * smoothed[i]
+            smoothed[i] = min(max(level, zero), one)
+
+else:
+    _update_levels = None
+
+
+def _argmax_abs_numpy(x, block_size=1 << 18):
+    """Index of the largest |x|, computing |x| one cache-sized tile at a time."""
+    best_index = 0
+    best_value = -1.0
+    for start in range(0, x.size, block_size):
+        tile = np.abs(x[start:start + block_size])
+        i = int(tile.argmax())
+        if tile[i] > best_value:
+            best_index = start + i
+            best_value = tile[i]
+    return best_index
+
+
+if njit is not None:
+
+    @njit(cache=True)
+    def _argmax_abs(x):
+        """Index of the largest |x| in a single pass, without a |x| temporary."""
+        best_index = 0
+        best_value = -1.0
+        for i in range(x.size):
+            v = x[i] if x[i] >= 0 else -x[i]
+            if v > best_value:
+                best_index = i
+                best_value = v
+        return best_index
+
+else:
+    _argmax_abs = _argmax_abs_numpy
+
+
+def argmax_abs(x):
+    """
+    Find the sample with the largest absolute value.
+
+    Equivalent to np.argmax(np.abs(x)) but never allocates a full-length
+    |x| array, which matters for whole-song buffers.
+
+    Args:
+        x: 1-D numpy array of audio samples
+
+    Returns:
+        int: index of the first sample with the largest magnitude
+    """
+    return int(_argmax_abs(np.ascontiguousarray(x)))
+
+
+def root_mean_square(x):
+    """
+    RMS of a 1-D signal as one BLAS dot product, without an x**2 temporary.
+
+    Args:
+        x: 1-D numpy array of audio samples
+
+    Returns:
+        float: sqrt(mean(x**2)), or 0.0 for an empty array
+    """
+    if x.size == 0:
+        return 0.0
+    return math.sqrt(float(np.dot(x, x)) / x.size)
 
 
 class AudioAnalyzer:
@@ -23,87 +161,120 @@ class AudioAnalyzer:
         self.buffer_size = buffer_size
         self.smoothing = smoothing
 
-        # Smoothed values for preventing jitter
-        self.smoothed_bass = 0.0
-        self.smoothed_mids = 0.0
-        self.smoothed_treble = 0.0
+        # Smoothed values for preventing jitter, bands as (bass, mids, treble)
+        self.smoothed = np.zeros(3, dtype=np.float32)
         self.smoothed_amplitude = 0.0
 
-        # Auto-gain control
-        self.max_bass = 1.0
-        self.max_mids = 1.0
-        self.max_treble = 1.0
+        # Auto-gain control, per band max as (bass, mids, treble)
+        self.max_bands = np.ones(3, dtype=np.float32)
         self.gain_decay = 0.995  # Slowly decay max values
 
+        # Recent chunk energies for beat detection (~1 s at 2048/22050)
+        self._energy_hist = np.zeros(43, dtype=np.float32)
+        self._energy_idx = 0
+        self._energy_count = 0
+
+        # Reusable FFT input and |X| buffers, resized if the chunk length changes
+        self._fft_in = np.empty(buffer_size, dtype=np.float32)
+        self._fft_mag = np.empty(buffer_size // 2 + 1, dtype=np.float32)
+
+        # FFT bin bounds per band, keyed by chunk length
+        self._band_bounds = {}
+        self._get_band_bounds(buffer_size)
+
+    def _get_band_bounds(self, n):
+        """
+        Return the FFT bin bounds of each band for an n-sample chunk.
+
+        Bounds are a flat (bass_lo, bass_hi, mids_lo, mids_hi, treble_lo,
+        treble_hi) tuple of bin indices.
+
+        The bins of a real FFT are sorted by frequency, so each band is a
+        contiguous slice. Bounds are computed once per chunk length.
+        """
+        bounds = self._band_bounds.get(n)
+        if bounds is None:
+            frequencies = rfftfreq(n, 1 / self.sample_rate)
+            edges = np.searchsorted(
+                frequencies, BASS_RANGE + MIDS_RANGE + TREBLE_RANGE
+            )
+            bounds = tuple(int(edge) for edge in edges)
+            self._band_bounds[n] = bounds
+        return bounds
+
     def analyze(self, audio_chunk):
         """
         Analyze an audio chunk and extract frequency bands.
 
         Args:
-            audio_chunk: numpy array of audio samples
+            audio_chunk: numpy array of audio samples (converted to float32)
 
         Returns:
             tuple: (bass, mids, treble) normalized to 0.0-1.0 range
         """
-        # Compute FFT
-        fft_data = np.fft.rfft(audio_chunk)
-        fft_magnitude = np.abs(fft_data)
+        n = len(audio_chunk)
 
-        # Get frequency bins
-        frequencies = np.fft.rfftfreq(len(audio_chunk), 1 / self.sample_rate)
+        # Silent chunk: fade the bands out without running the FFT
+        if n == 0 or abs(audio_chunk[argmax_abs(audio_chunk)]) < SILENCE_PEAK:
+            self.smoothed *= SILENCE_DECAY
+            return tuple(self.smoothed)
+
+        if self._fft_in.size != n:
+            self._fft_in = np.empty(n, dtype=np.float32)
+            self._fft_mag = np.empty(n // 2 + 1, dtype=np.float32)
+
+        # Compute FFT on the float32 scratch copy, which it may overwrite
+        np.copyto(self._fft_in, audio_chunk)
+        spectrum = rfft(self._fft_in, overwrite_x=True, workers=1)
 
         # Extract frequency bands
         # Bass: 20-250 Hz (kick drums, bass guitar)
-        bass_mask = (frequencies >= 20) & (frequencies < 250)
-        bass = np.mean(fft_magnitude[bass_mask]) if bass_mask.any() else 0
-
         # Mids: 250-4000 Hz (vocals, most instruments)
-        mids_mask = (frequencies >= 250) & (frequencies < 4000)
-        mids = np.mean(fft_magnitude[mids_mask]) if mids_mask.any() else 0
-
         # Treble: 4000-20000 Hz (cymbals, hi-hats)
-        treble_mask = (frequencies >= 4000) & (frequencies < 20000)
-        treble = np.mean(fft_magnitude[treble_mask]) if treble_mask.any() else 0
+        bounds = self._get_band_bounds(n)
+        if _band_means is not None:
+            bass, mids, treble = _band_means(spectrum, bounds)
+        else:
+            bass, mids, treble = _band_means_numpy(spectrum, bounds, out=self._fft_mag)
+
+        if _update_levels is not None:
+            _update_levels(
+                bass, mids, treble, self.max_bands, self.smoothed,
+                np.float32(self.gain_decay), np.float32(self.smoothing),
+                np.float32(1 - self.smoothing),
+            )
+            return tuple(self.smoothed)
+
+        bands = np.array((bass, mids, treble), dtype=np.float32)
 
         # Update max values for auto-gain
-        self.max_bass = max(bass, self.max_bass * self.gain_decay)
-        self.max_mids = max(mids, self.max_mids * self.gain_decay)
-        self.max_treble = max(treble, self.max_treble * self.gain_decay)
+        self.max_bands = np.maximum(bands, self.max_bands * self.gain_decay)
 
         # Normalize to 0-1 range
-        bass_norm = bass / self.max_bass if self.max_bass > 0 else 0
-        mids_norm = mids / self.max_mids if self.max_mids > 0 else 0
-        treble_norm = treble / self.max_treble if self.max_treble > 0 else 0
+        norm = np.divide(
+            bands, self.max_bands, out=np.zeros(3, dtype=np.float32), where=self.max_bands > 0
+        )
 
         # Apply exponential smoothing
-        self.smoothed_bass = (
-            self.smoothing * bass_norm + (1 - self.smoothing) * self.smoothed_bass
-        )
-        self.smoothed_mids = (
-            self.smoothing * mids_norm + (1 - self.smoothing) * self.smoothed_mids
-        )
-        self.smoothed_treble = (
-            self.smoothing * treble_norm + (1 - self.smoothing) * self.smoothed_treble
-        )
+        self.smoothed = self.smoothing * norm + (1 - self.smoothing) * self.smoothed
 
         # Clamp to 0-1 range
-        self.smoothed_bass = np.clip(self.smoothed_bass, 0.0, 1.0)
-        self.smoothed_mids = np.clip(self.smoothed_mids, 0.0, 1.0)
-        self.smoothed_treble = np.clip(self.smoothed_treble, 0.0, 1.0)
+        np.clip(self.smoothed, 0.0, 1.0, out=self.smoothed)
 
-        return self.smoothed_bass, self.smoothed_mids, self.smoothed_treble
+        return tuple(self.smoothed)
 
     def get_amplitude(self, audio_chunk):
         """
         Calculate the RMS amplitude of an audio chunk.
 
         Args:
-            audio_chunk: numpy array of audio samples
+            audio_chunk: numpy array of audio samples (converted to float32)
 
         Returns:
             float: RMS amplitude normalized to 0.0-1.0 range
         """
-        rms = np.sqrt(np.mean(audio_chunk**2))
+        audio_chunk = np.asarray(audio_chunk, dtype=np.float32)
+        rms = root_mean_square(audio_chunk)
 
         # Smooth the amplitude
         self.smoothed_amplitude = (
@@ -118,17 +289,27 @@ class AudioAnalyzer:
         Simple energy-based beat detection.
 
         Args:
-            audio_chunk: numpy array of audio samples
+            audio_chunk: numpy array of audio samples (converted to float32)
             threshold: Energy ratio needed to trigger beat (default: 1.5)
 
         Returns:
             bool: True if beat detected
         """
+        audio_chunk = np.asarray(audio_chunk, dtype=np.float32)
+
         # Calculate instantaneous energy
-        energy = np.sum(audio_chunk**2)
+        energy = float(np.dot(audio_chunk, audio_chunk))
+
+        # Check against the average energy of the recent chunks
+        if self._energy_count > 0:
+            average = self._energy_hist[: self._energy_count].mean()
+            is_beat = energy > threshold * average
+        else:
+            is_beat = False
 
-        # Check against recent average (simplified version)
-        # In production, you'd maintain a buffer of recent energies
-        is_beat = energy > threshold * np.mean(audio_chunk**2)
+        # Record this chunk in the energy history ring buffer
+        self._energy_hist[self._energy_idx] = energy
+        self._energy_idx = (self._energy_idx + 1) % self._energy_hist.size
+        self._energy_count = min(self._energy_count + 1, self._energy_hist.size)
 
-        return is_beat
+        return bool(is_beat)
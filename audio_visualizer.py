@@ -23,7 +23,7 @@ from concurrent.futures import ThreadPoolExecutor
 from wiz_control import WizLight
 from audio_analysis import AudioAnalyzer
 from color_mapping import (
-    FrequencyToRGBMapper,
+    make_freq_rgb_mapper,
     MultiLightMapper,
     PulseModeMapper,
     StrobeModeMapper,
@@ -145,7 +145,7 @@ class AudioVisualizer:
                 max_step=8,
             )
         else:
-            self.mapper = FrequencyToRGBMapper(
+            self.mapper = make_freq_rgb_mapper(
                 mode=mode, brightness_boost=brightness_boost
             )
 
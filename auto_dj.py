@@ -5,6 +5,18 @@ import numpy as np
 import soundfile as sf
 import subprocess
 from i18n_manager import t  # Importamos el gestor de idiomas
+from audio_analysis import root_mean_square
+
+# --- PERFILES DE AUTO-DJ ---
+# Límites de RMS que separan los perfiles (ordenados de menor a mayor)
+RMS_THRESHOLDS = np.array([0.05, 0.10, 0.22])
+# (clave de género, boost de brillo, smoothing) para cada tramo de RMS
+RMS_PRESETS = (
+    ("genre_ambient", 2.5, "0.3"),
+    ("genre_dynamic", 1.6, "0.25"),
+    ("genre_rock", 1.2, "0.2"),
+    ("genre_metal", 0.9, "0.15"),
+)
 
 # --- INICIO DEL PROGRAMA ---
 os.system('cls' if os.name == 'nt' else 'clear')
@@ -25,7 +37,7 @@ print(t("analyzing", nombre_archivo))
 # --- LECTURA Y CÁLCULO ---
 print(t("reading_data"))
 try:
-    data, samplerate = sf.read(ruta_archivo)
+    data, samplerate = sf.read(ruta_archivo, dtype='float32')
 except Exception as e:
     print(f"❌ Error: {e}")
     sys.exit()
@@ -35,34 +47,16 @@ if len(data.shape) > 1:
     data = np.mean(data, axis=1)
 
 # Calcular RMS
-rms = np.sqrt(np.mean(data**2))
+rms = root_mean_square(data)
 print(t("energy_detected", rms))
 
 # --- LÓGICA DE AUTO-DJ ---
 sensibilidad_base = 0.16 / (rms + 0.001)
 sensibilidad_final = np.clip(sensibilidad_base, 0.5, 3.8)
 
-# Configuración por defecto
-boost_brillo = 1.0
-smoothing = "0.2"
-tipo = "Standard"
-
-if rms < 0.05: 
-    tipo = t("genre_ambient")
-    boost_brillo = 2.5
-    smoothing = "0.3"
-elif rms < 0.10:
-    tipo = t("genre_dynamic")
-    boost_brillo = 1.6
-    smoothing = "0.25"
-elif rms > 0.22:
-    tipo = t("genre_metal")
-    boost_brillo = 0.9
-    smoothing = "0.15"
-else:
-    tipo = t("genre_rock")
-    boost_brillo = 1.2
-    smoothing = "0.2"
+idx = int(np.searchsorted(RMS_THRESHOLDS, rms, side="right"))
+genero, boost_brillo, smoothing = RMS_PRESETS[idx]
+tipo = t(genero)
 
 print("-" * 50)
 print(f"🎹 {tipo}")
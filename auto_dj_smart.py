@@ -1,17 +1,103 @@
 import sys
 import os
 import time
+import functools
+import json
 import numpy as np
 import soundfile as sf
+from scipy.fft import rfft, irfft, rfftfreq
 import subprocess
 import requests
 import re 
+from concurrent.futures import ThreadPoolExecutor
 from i18n_manager import t
+from audio_analysis import argmax_abs, root_mean_square
 
 # --- CONFIGURACIÓN ---
 # SECURITY PATCH: Usamos variables de entorno o un placeholder seguro
 API_KEY = os.getenv("YOUR_LASTFM_API_KEY_HERE")
 API_URL = "https://ws.audioscrobbler.com/2.0/"
+# Caché persistente de tags de Last.fm, clave "artista|canción"
+CACHE_LASTFM = os.path.join(os.path.expanduser("~"), ".wiz_hack", "lastfm.json")
+# Sesión HTTP compartida: reutiliza la conexión TLS entre consultas
+SESION_HTTP = requests.Session()
+SESION_HTTP.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=4))
+
+# Perfiles de decisión: (clave de motivo, modo visual, boost de brillo,
+# smoothing, multiplicador de sensibilidad). Índices: 0 = bajo dominante,
+# 1 = golpe rítmico (crest alto), 2 = muro de sonido.
+PERFILES = (
+    ("reason_bass", "spectrum_pulse", 1.0, "0.22", 1.0),
+    ("reason_punch", "spectrum_pulse", 1.1, "0.20", 1.0),
+    ("reason_wall", "spectrum_gradient", 1.4, "0.10", 1.5),
+)
+
+
+@functools.lru_cache(maxsize=8)
+def _freq_cutoff(n, sr, hz):
+    """Número de bins de rfft(n) con frecuencia <= hz (los bins están ordenados)."""
+    return int(np.searchsorted(rfftfreq(n, 1/sr), hz, side="right"))
+
+
+def cargar_cache_lastfm():
+    try:
+        with open(CACHE_LASTFM, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def guardar_cache_lastfm(cache):
+    try:
+        os.makedirs(os.path.dirname(CACHE_LASTFM), exist_ok=True)
+        with open(CACHE_LASTFM, "w", encoding="utf-8") as f:
+            json.dump(cache, f, ensure_ascii=False, indent=1)
+    except OSError:
+        pass
+
+
+def _tags_cancion(artista, q):
+    try:
+        url = f"{API_URL}?method=track.getInfo&api_key={API_KEY}&artist={artista}&track={q}&autocorrect=1&format=json"
+        data = SESION_HTTP.get(url, timeout=1.5).json()
+        if 'track' in data and 'toptags' in data['track']:
+            tags = [tag['name'].title() for tag in data['track']['toptags']['tag']]
+            return [tag for tag in tags if "Live" not in tag]
+    except: pass
+    return []
+
+
+def _tags_artista(artista):
+    try:
+        url = f"{API_URL}?method=artist.getTopTags&api_key={API_KEY}&artist={artista}&autocorrect=1&format=json"
+        data = SESION_HTTP.get(url, timeout=1.5).json()
+        if 'toptags' in data: return [tag['name'].title() for tag in data['toptags']['tag']]
+    except: pass
+    return []
+
+
+def get_tags(artista, cancion):
+    """Tags de Last.fm para la canción (o el artista), usando la caché en disco."""
+    cache = cargar_cache_lastfm()
+    clave = f"{artista}|{cancion}"
+    if clave in cache:
+        return cache[clave]
+
+    # Las consultas van en paralelo sobre la sesión compartida; se usa la primera
+    # con tags según la prioridad (canción, canción en minúsculas, artista)
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        futuros = [pool.submit(_tags_cancion, artista, q)
+                   for q in dict.fromkeys([cancion, cancion.lower()])]
+        futuros.append(pool.submit(_tags_artista, artista))
+        resultados = [f.result() for f in futuros]
+    tags_encontrados = next((tags for tags in resultados if tags), [])
+
+    # Solo guardamos aciertos: un fallo de red no debe quedar cacheado
+    if tags_encontrados:
+        cache[clave] = tags_encontrados
+        guardar_cache_lastfm(cache)
+    return tags_encontrados
+
 
 # Limpiar consola
 os.system('cls' if os.name == 'nt' else 'clear')
@@ -45,25 +131,7 @@ print(t("file_label", cancion))
 genero_bonito = "..."
 if artista and API_KEY != "YOUR_LASTFM_API_KEY_HERE":
     print(t("consulting_lastfm"))
-    tags_encontrados = []
-    # (Lógica de requests simplificada para brevedad, misma funcionalidad)
-    for q in [cancion, cancion.lower()]:
-        try:
-            url = f"{API_URL}?method=track.getInfo&api_key={API_KEY}&artist={artista}&track={q}&autocorrect=1&format=json"
-            data = requests.get(url, timeout=1.5).json()
-            if 'track' in data and 'toptags' in data['track']:
-                tags = [tag['name'].title() for tag in data['track']['toptags']['tag']]
-                tags = [tag for tag in tags if "Live" not in tag]
-                if tags: tags_encontrados = tags; break
-        except: continue
-    
-    if not tags_encontrados:
-        try:
-            url = f"{API_URL}?method=artist.getTopTags&api_key={API_KEY}&artist={artista}&autocorrect=1&format=json"
-            data = requests.get(url, timeout=1.5).json()
-            if 'toptags' in data: tags_encontrados = [tag['name'].title() for tag in data['toptags']['tag']]
-        except: pass
-            
+    tags_encontrados = get_tags(artista, cancion)
     if tags_encontrados: genero_bonito = ", ".join(tags_encontrados[:2])
     else: genero_bonito = t("genre_unknown")
 else:
@@ -73,31 +141,53 @@ else:
 print(t("scanning_audio"))
 
 try:
-    data, samplerate = sf.read(ruta_archivo)
-    if len(data.shape) > 1: audio_mono = np.mean(data, axis=1)
-    else: audio_mono = data
-    
-    peak_index = np.argmax(np.abs(audio_mono))
-    start = max(0, peak_index - samplerate) 
-    end = min(len(audio_mono), peak_index + samplerate) 
-    chunk = audio_mono[start:end] 
-    
-    rms_global = np.sqrt(np.mean(audio_mono**2))
+    with sf.SoundFile(ruta_archivo) as f:
+        samplerate = f.samplerate
+
+        # Primera pasada por bloques de ~1s: pico y suma de cuadrados (RMS)
+        # sin cargar la canción entera en memoria
+        peak_index = 0
+        peak_value = -1.0
+        suma_cuadrados = 0.0
+        total_muestras = 0
+        for bloque in f.blocks(blocksize=samplerate, dtype='float32', always_2d=True):
+            mono = bloque.mean(axis=1, dtype=np.float32)
+            i = argmax_abs(mono)
+            if abs(mono[i]) > peak_value:
+                peak_value = abs(mono[i])
+                peak_index = total_muestras + i
+            suma_cuadrados += float(np.dot(mono, mono))
+            total_muestras += len(mono)
+
+        rms_global = np.sqrt(suma_cuadrados / total_muestras)
+
+        # Segunda lectura: solo la ventana de ±1s alrededor del clímax
+        start = max(0, peak_index - samplerate)
+        end = min(total_muestras, peak_index + samplerate)
+        f.seek(start)
+        chunk = f.read(end - start, dtype='float32', always_2d=True).mean(axis=1, dtype=np.float32)
     
     if len(chunk) > 0:
-        spectrum = np.fft.rfft(chunk) 
-        freqs = np.fft.rfftfreq(len(chunk), 1/samplerate)
+        spectrum = rfft(chunk) 
         
-        bass_spectrum = np.copy(spectrum)
-        bass_spectrum[freqs > 150] = 0 
-        bass_waveform = np.fft.irfft(bass_spectrum)
+        # El bajo (<=150Hz) es un prefijo del espectro
+        cutoff = _freq_cutoff(len(chunk), samplerate, 150)
+        bass_spectrum = np.zeros_like(spectrum)
+        bass_spectrum[:cutoff] = spectrum[:cutoff]
+        bass_waveform = irfft(bass_spectrum)
+        magnitud = np.abs(spectrum)
         
+        # RMS del bajo por Parseval, directamente desde el espectro de una cara:
+        # sum(x^2) = (|X0|^2 + 2*sum(|Xk|^2)) / n, con n = len(bass_waveform)
+        n = 2 * (len(spectrum) - 1)
+        mag_bajo = magnitud[:cutoff]
+        rms_bass = np.sqrt(2 * np.dot(mag_bajo, mag_bajo) - np.dot(mag_bajo[:1], mag_bajo[:1])) / n
+        # El pico sí necesita la forma de onda (filtro ideal, igual que antes)
         peak_bass = np.max(np.abs(bass_waveform))
-        rms_bass = np.sqrt(np.mean(bass_waveform**2))
         crest_factor = peak_bass / (rms_bass + 0.0001)
         
-        energy_bass = np.sum(np.abs(spectrum[np.where(freqs <= 150)]))
-        total_energy = np.sum(np.abs(spectrum))
+        energy_bass = np.sum(magnitud[:cutoff])
+        total_energy = np.sum(magnitud)
         bass_ratio = energy_bass / (total_energy + 0.001)
 
     else:
@@ -113,26 +203,10 @@ except Exception as e:
 sensibilidad = 0.16 / (rms_global + 0.001)
 sensibilidad = np.clip(sensibilidad, 0.5, 6.0)
 
-modo_visual = "spectrum_pulse"
-boost_brillo = 1.0
-smoothing = "0.22"
-tipo_info = t("tuned_analysis")
-
-if bass_ratio > 0.40: 
-    tipo_info = t("reason_bass")
-    modo_visual = "spectrum_pulse"
-    boost_brillo = 1.0
-elif crest_factor > 3.0:
-    tipo_info = t("reason_punch", crest_factor)
-    modo_visual = "spectrum_pulse"
-    boost_brillo = 1.1
-    smoothing = "0.20"
-else:
-    tipo_info = t("reason_wall", crest_factor)
-    modo_visual = "spectrum_gradient" 
-    boost_brillo = 1.4
-    sensibilidad = sensibilidad * 1.5
-    smoothing = "0.10"
+perfil = 0 if bass_ratio > 0.40 else 1 if crest_factor > 3.0 else 2
+clave_motivo, modo_visual, boost_brillo, smoothing, mult_sensibilidad = PERFILES[perfil]
+tipo_info = t(clave_motivo, crest_factor)
+sensibilidad = sensibilidad * mult_sensibilidad
 
 # --- 5. RESULTADOS ---
 print("-" * 60)
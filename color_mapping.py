@@ -6,78 +6,215 @@ Maps frequency bands to color channels for audio-reactive lighting.
 
 import numpy as np
 import time
-import colorsys
+from collections import deque
+from math import sqrt
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional, kernels then run as plain Python
+    njit = None
+
+# Scalar kernels are compiled once and cached on disk, so later launches skip the JIT warm-up
+_jit = njit(cache=True) if njit is not None else (lambda func: func)
+
+
+def _clip(x, lo, hi):
+    """Scalar np.clip without the ufunc dispatch (hi wins if lo > hi, like np.clip)."""
+    x = lo if x < lo else x
+    return hi if x > hi else x
+
+
+# Brightness curves are tabulated at _CURVE_STEPS + 1 evenly spaced levels
+_CURVE_STEPS = 1023
+
+
+def _curve_lut(min_b, max_b, gamma):
+    """int(min_b + norm**gamma * (max_b - min_b)) for norm = i / _CURVE_STEPS."""
+    norm = np.linspace(0.0, 1.0, _CURVE_STEPS + 1)
+    return (min_b + norm**gamma * (max_b - min_b)).astype(np.int64)
+
+
+@_jit
+def _pulse_target(level, peak, noise_gate, min_b, curve):
+    """Target brightness of level against its running peak (min_b below the noise gate)."""
+    if peak <= 1e-6 or level < noise_gate * peak:
+        return min_b
+    norm = min(max(level / (peak + 1e-6), 0.0), 1.0)
+    return int(curve[int(norm * _CURVE_STEPS)])
+
+
+@_jit
+def _slew(target, prev, max_step, min_b, max_b):
+    """Move prev toward target by at most max_step, clamped to [min_b, max_b]."""
+    delta = min(max(target - prev, -max_step), max_step)
+    return min(max(prev + delta, min_b), max_b)
+
+
+@_jit
+def _pulse_step(level, peak, prev, noise_gate, min_b, max_b, max_step, curve):
+    """One peak-follower frame: gated gamma-curve target, then slew-limited brightness."""
+    return _slew(_pulse_target(level, peak, noise_gate, min_b, curve), prev, max_step, min_b, max_b)
+
+
+@_jit
+def _pulse_pair(level1, level2, peak1, peak2, prev1, prev2, noise_gate, min_b, max_b, step1, step2, curve1, curve2):
+    """Both lights of a two-light peak follower in one compiled call, as (brightness1, brightness2)."""
+    return (_pulse_step(level1, peak1, prev1, noise_gate, min_b, max_b, step1, curve1),
+            _pulse_step(level2, peak2, prev2, noise_gate, min_b, max_b, step2, curve2))
+
+
+def _is_gated(level, peak, noise_gate):
+    """True when level is below the noise gate of its running peak (target is then min_b)."""
+    return peak <= 1e-6 or level < noise_gate * peak
+
+
+def _dominant_band(bass, mids, treble):
+    """Palette index of the dominant band: 0 = bass, 1 = treble, 2 = mids (bass, then treble win ties)."""
+    if bass >= mids and bass >= treble: return 0
+    if treble >= mids: return 1
+    return 2
+
+
+@_jit
+def _freq_bands_kernel(bass, mids, treble, amplitude, brightness_boost, min_brightness):
+    """frequency_bands: bass/mids/treble -> R/G/B on an x**1.5 = sqrt(x)*x curve (amplitude < 0 means none)."""
+    r = int(min(sqrt(bass) * bass * 255, 255.0))
+    g = int(min(sqrt(mids) * mids * 255, 255.0))
+    b = int(min(sqrt(treble) * treble * 255, 255.0))
+
+    if amplitude >= 0:
+        level = amplitude
+    else:
+        level = (bass + mids + treble) / 3
+    brightness = int(min(max(min_brightness + level * 90 * brightness_boost, 0.0), 100.0))
+    return r, g, b, brightness
+
+
+@_jit
+def _energy_kernel(bass, mids, treble, brightness_boost, min_brightness):
+    """energy: warm colors above half energy, cool colors below."""
+    total_energy = (bass + mids + treble) / 3
+    if total_energy > 0.5:
+        r = int(255 * total_energy)
+        g = int(165 * total_energy)
+        b = int(50 * (1 - total_energy))
+    else:
+        r = int(128 * total_energy)
+        g = int(50 * total_energy)
+        b = int(255 * (1 - total_energy))
+
+    brightness = int(min(max(min_brightness + total_energy * 90 * brightness_boost, 0.0), 100.0))
+    return r, g, b, brightness
+
+
+@_jit
+def _rainbow_kernel(bass, mids, treble, brightness_boost, min_brightness):
+    """rainbow: color and brightness of the dominant band."""
+    if bass >= mids and bass >= treble:
+        dominant_intensity = bass
+        r, g, b = int(255 * bass), int(50 * bass), int(200 * bass)
+    elif mids >= treble:
+        dominant_intensity = mids
+        r, g, b = int(200 * mids), int(255 * mids), int(50 * mids)
+    else:
+        dominant_intensity = treble
+        r, g, b = int(50 * treble), int(200 * treble), int(255 * treble)
+
+    brightness = int(min(max(min_brightness + dominant_intensity * 90 * brightness_boost, 0.0), 100.0))
+    return r, g, b, brightness
 
 
 class FrequencyToRGBMapper:
     """Maps audio frequency bands to RGB color values."""
 
+    __slots__ = ("mode", "brightness_boost", "min_brightness", "_dispatch")
+
     def __init__(self, mode="frequency_bands", brightness_boost=1.5):
         self.mode = mode
         self.brightness_boost = brightness_boost
         self.min_brightness = 10 
+        # Resolve the mode once; unknown modes fall back to frequency_bands.
+        # The per-mode subclasses override map() and never dispatch.
+        if type(self).map is FrequencyToRGBMapper.map:
+            self._dispatch = {
+                "frequency_bands": self._frequency_bands_mapping,
+                "energy": self._energy_mapping,
+                "rainbow": self._rainbow_mapping,
+            }.get(mode, self._frequency_bands_mapping)
 
     def map(self, bass, mids, treble, amplitude=None):
-        if self.mode == "frequency_bands":
-            return self._frequency_bands_mapping(bass, mids, treble, amplitude)
-        elif self.mode == "energy":
-            return self._energy_mapping(bass, mids, treble, amplitude)
-        elif self.mode == "rainbow":
-            return self._rainbow_mapping(bass, mids, treble, amplitude)
-        else:
-            return self._frequency_bands_mapping(bass, mids, treble, amplitude)
+        return self._dispatch(bass, mids, treble, amplitude)
 
-    def _frequency_bands_mapping(self, bass, mids, treble, amplitude):
-        bass_scaled = self._apply_curve(bass, power=1.5)
-        mids_scaled = self._apply_curve(mids, power=1.5)
-        treble_scaled = self._apply_curve(treble, power=1.5)
+    def _frequency_bands_mapping(self, bass, mids, treble, amplitude=None):
+        return _freq_bands_kernel(
+            float(bass), float(mids), float(treble),
+            -1.0 if amplitude is None else float(amplitude),
+            float(self.brightness_boost), float(self.min_brightness),
+        )
 
-        r = int(np.clip(bass_scaled * 255, 0, 255))
-        g = int(np.clip(mids_scaled * 255, 0, 255))
-        b = int(np.clip(treble_scaled * 255, 0, 255))
+    def _energy_mapping(self, bass, mids, treble, amplitude=None):
+        return _energy_kernel(
+            float(bass), float(mids), float(treble),
+            float(self.brightness_boost), float(self.min_brightness),
+        )
 
-        if amplitude is not None:
-            brightness = int(np.clip(self.min_brightness + amplitude * 90 * self.brightness_boost, 0, 100))
-        else:
-            avg_intensity = (bass + mids + treble) / 3
-            brightness = int(np.clip(self.min_brightness + avg_intensity * 90 * self.brightness_boost, 0, 100))
+    def _rainbow_mapping(self, bass, mids, treble, amplitude=None):
+        return _rainbow_kernel(
+            float(bass), float(mids), float(treble),
+            float(self.brightness_boost), float(self.min_brightness),
+        )
 
-        return r, g, b, brightness
 
-    def _energy_mapping(self, bass, mids, treble, amplitude):
-        total_energy = (bass + mids + treble) / 3
-        if total_energy > 0.5:
-            r = int(255 * total_energy)
-            g = int(165 * total_energy) 
-            b = int(50 * (1 - total_energy))
-        else:
-            r = int(128 * total_energy)
-            g = int(50 * total_energy)
-            b = int(255 * (1 - total_energy))
+# Per-mode subclasses whose map() is the mode's mapping itself, with no dispatch per call
+class _FrequencyBandsMapper(FrequencyToRGBMapper):
+    __slots__ = ()
+    map = FrequencyToRGBMapper._frequency_bands_mapping
 
-        brightness = int(np.clip(self.min_brightness + total_energy * 90 * self.brightness_boost, 0, 100))
-        return r, g, b, brightness
 
-    def _rainbow_mapping(self, bass, mids, treble, amplitude):
-        bands = [bass, mids, treble]
-        dominant_idx = np.argmax(bands)
-        dominant_intensity = bands[dominant_idx]
+class _EnergyMapper(FrequencyToRGBMapper):
+    __slots__ = ()
+    map = FrequencyToRGBMapper._energy_mapping
 
-        if dominant_idx == 0: 
-            r, g, b = int(255 * dominant_intensity), int(50 * dominant_intensity), int(200 * dominant_intensity)
-        elif dominant_idx == 1: 
-            r, g, b = int(200 * dominant_intensity), int(255 * dominant_intensity), int(50 * dominant_intensity)
-        else: 
-            r, g, b = int(50 * dominant_intensity), int(200 * dominant_intensity), int(255 * dominant_intensity)
 
-        brightness = int(np.clip(self.min_brightness + dominant_intensity * 90 * self.brightness_boost, 0, 100))
-        return r, g, b, brightness
+class _RainbowMapper(FrequencyToRGBMapper):
+    __slots__ = ()
+    map = FrequencyToRGBMapper._rainbow_mapping
+
+
+_MODE_MAPPERS = {
+    "frequency_bands": _FrequencyBandsMapper,
+    "energy": _EnergyMapper,
+    "rainbow": _RainbowMapper,
+}
+
 
-    def _apply_curve(self, value, power=2.0):
-        return np.power(value, power)
+def make_freq_rgb_mapper(mode="frequency_bands", brightness_boost=1.5):
+    """Build a FrequencyToRGBMapper specialized to mode (unknown modes use frequency_bands)."""
+    return _MODE_MAPPERS.get(mode, _FrequencyBandsMapper)(mode=mode, brightness_boost=brightness_boost)
+
+
+def to_color_array(colors, num_lights):
+    """
+    Pack any mapper output into a (num_lights, 4) uint8 array of (r, g, b, brightness) rows.
+
+    A single color (tuple or flat list) is repeated for every light; a per-light
+    list whose length does not match num_lights falls back to its first color;
+    an empty result turns every light off.
+    """
+    arr = np.asarray(colors)
+    if arr.size == 0:
+        # No colors (e.g. map_lights with no lights connected)
+        return np.zeros((num_lights, 4), np.uint8)
+    if arr.ndim == 1:
+        arr = arr[np.newaxis]
+    elif len(arr) != num_lights:
+        arr = arr[:1]
+    return np.broadcast_to(np.clip(arr, 0, 255), (num_lights, 4)).astype(np.uint8)
 
 
 class BeatReactiveMapper:
+    __slots__ = ("base_mapper", "flash_duration", "beat_timer", "is_flashing")
+
     def __init__(self, base_mapper, flash_duration=0.1):
         self.base_mapper = base_mapper
         self.flash_duration = flash_duration
@@ -94,54 +231,52 @@ class BeatReactiveMapper:
 
 
 class MultiLightMapper:
+    # RGB weights of the first three lights, one row per band (bass, mids, treble)
+    _WEIGHTS = np.array([[255, 50, 200], [200, 255, 50], [50, 200, 255]], dtype=np.float64)
+    # Band order (as r, g, b) of the extra lights, indexed by light % 3
+    _PERM = np.array([[0, 2, 1], [1, 0, 2], [2, 1, 0]])
+
+    __slots__ = ()
+
     def __init__(self):
         pass
 
     def map_lights(self, bass, mids, treble, num_lights=3):
-        colors = []
-        if num_lights >= 1:
-            r = int(bass * 255)
-            g = int(bass * 50)
-            b = int(bass * 200)
-            brightness = int(np.clip(10 + bass * 90, 0, 100))
-            colors.append((r, g, b, brightness))
-
-        if num_lights >= 2:
-            r = int(mids * 200)
-            g = int(mids * 255)
-            b = int(mids * 50)
-            brightness = int(np.clip(10 + mids * 90, 0, 100))
-            colors.append((r, g, b, brightness))
-
-        if num_lights >= 3:
-            r = int(treble * 50)
-            g = int(treble * 200)
-            b = int(treble * 255)
-            brightness = int(np.clip(10 + treble * 90, 0, 100))
-            colors.append((r, g, b, brightness))
-
-        for i in range(3, num_lights):
-            offset = i % 3
-            if offset == 0:
-                r, g, b = int(bass * 255), int(treble * 255), int(mids * 255)
-            elif offset == 1:
-                r, g, b = int(mids * 255), int(bass * 255), int(treble * 255)
-            else:
-                r, g, b = int(treble * 255), int(mids * 255), int(bass * 255)
+        num_lights = max(num_lights, 0)
+        num_base = min(num_lights, 3)
+        bands = np.array([bass, mids, treble], dtype=np.float64)
+
+        rgb = np.empty((num_lights, 3), dtype=np.float64)
+        levels = np.empty(num_lights, dtype=np.float64)
+
+        # Lights 0-2: one band each, tinted by its weight row
+        rgb[:num_base] = self._WEIGHTS[:num_base] * bands[:num_base, None]
+        levels[:num_base] = bands[:num_base]
 
-            avg = (bass + mids + treble) / 3
-            brightness = int(np.clip(10 + avg * 90, 0, 100))
-            colors.append((r, g, b, brightness))
+        # Extra lights: rotate the bands across channels, brightness from the average
+        rgb[3:] = bands[self._PERM[np.arange(3, num_lights) % 3]] * 255
+        levels[3:] = (bass + mids + treble) / 3
 
-        return colors
+        # Clip in place so out-of-range bands still give valid 8-bit channels
+        rgb = np.clip(rgb, 0, 255, out=rgb).astype(np.uint8)
+        brightness = np.clip(10 + levels * 90, 0, 100).astype(np.int32)
+        return list(zip(*rgb.T.tolist(), brightness.tolist()))
 
 
 class PulseModeMapper:
+    __slots__ = (
+        "base_color", "min_brightness", "max_brightness", "sensitivity", "_power",
+        "_brightness_range",
+    )
+
     def __init__(self, base_color=(255, 200, 150), sensitivity=1.0):
         self.base_color = base_color
         self.min_brightness = 10
         self.max_brightness = 100
         self.sensitivity = sensitivity
+        # Curve exponent and brightness span are fixed per instance
+        self._power = 1.5 / self.sensitivity if self.sensitivity > 0 else 1.5
+        self._brightness_range = self.max_brightness - self.min_brightness
 
     def map(self, bass, mids, treble, amplitude=None):
         r, g, b = self.base_color
@@ -150,32 +285,39 @@ class PulseModeMapper:
         else:
             energy = (bass + mids + treble) / 3
 
-        power = 1.5 / self.sensitivity if self.sensitivity > 0 else 1.5
-        brightness_range = self.max_brightness - self.min_brightness
-        brightness = int(np.clip(self.min_brightness + (energy**power) * brightness_range, self.min_brightness, self.max_brightness))
+        brightness = int(_clip(self.min_brightness + (energy**self._power) * self._brightness_range, self.min_brightness, self.max_brightness))
         return r, g, b, brightness
 
 
 class StrobeModeMapper:
+    __slots__ = (
+        "strobe_color", "threshold", "min_brightness", "max_brightness", "_low_cap",
+        "last_energy",
+    )
+
     def __init__(self, strobe_color=(255, 255, 255), threshold=1.3, sensitivity=1.0):
         self.strobe_color = strobe_color
         self.threshold = threshold / sensitivity if sensitivity > 0 else threshold
         self.min_brightness = 5
         self.max_brightness = 100
+        self._low_cap = self.max_brightness * 0.3
         self.last_energy = 0.0
 
     def map(self, bass, mids, treble, amplitude=None, is_beat=False):
         r, g, b = self.strobe_color
         current_energy = amplitude if amplitude is not None else (bass + mids + treble) / 3
-        energy_ratio = (current_energy / self.last_energy if self.last_energy > 0.01 else 1.0)
-        self.last_energy = current_energy * 0.7 + self.last_energy * 0.3
+        last_energy = self.last_energy
+        self.last_energy = current_energy * 0.7 + last_energy * 0.3
 
-        if energy_ratio > self.threshold or current_energy > 0.7:
-            brightness = self.max_brightness
-        else:
-            low_brightness = int(np.clip(current_energy * 40, self.min_brightness, self.max_brightness * 0.3))
-            brightness = int(np.clip(low_brightness, self.min_brightness, self.max_brightness))
-        return r, g, b, brightness
+        # Loud frames flash regardless of the ratio, so skip the division
+        if current_energy > 0.7:
+            return r, g, b, self.max_brightness
+
+        energy_ratio = (current_energy / last_energy if last_energy > 0.01 else 1.0)
+        if energy_ratio > self.threshold:
+            return r, g, b, self.max_brightness
+        # The low cap already lies inside [min_brightness, max_brightness]
+        return r, g, b, int(_clip(current_energy * 40, self.min_brightness, self._low_cap))
 
 
 class SpectrumPulseMapper:
@@ -184,24 +326,33 @@ class SpectrumPulseMapper:
     Incluye 'Smart Sensitivity' para detectar intros sin bajo (ej. ladridos)
     con INYECCIÓN DE POTENCIA para que brillen fuerte.
     """
+    # Colores base al 80%: int(c * 0.8) de (200, 50, 150), (255, 180, 50) y (50, 150, 255)
+    _BASS_COLOR = (160, 40, 120)
+    _MIDS_COLOR = (204, 144, 40)
+    _TREBLE_COLOR = (40, 120, 204)
+
+    __slots__ = (
+        "brightness_emphasis", "min_brightness", "max_brightness", "sensitivity", "_power",
+        "_brightness_range",
+    )
+
     def __init__(self, brightness_emphasis=2.0, sensitivity=1.0):
         self.brightness_emphasis = brightness_emphasis
         self.min_brightness = 5
         self.max_brightness = 100
         self.sensitivity = sensitivity
+        # Curve exponent and brightness span are fixed per instance
+        self._power = (1.0 / self.brightness_emphasis) / self.sensitivity if self.sensitivity > 0 else (1.0 / self.brightness_emphasis)
+        self._brightness_range = self.max_brightness - self.min_brightness
 
     def map(self, bass, mids, treble, amplitude=None):
-        bands = {"bass": bass, "mids": mids, "treble": treble}
-        dominant = max(bands, key=bands.get)
-
-        if dominant == "bass":
-            base_color = (200, 50, 150) 
-        elif dominant == "treble":
-            base_color = (50, 150, 255) 
+        # Banda dominante; en empate gana la primera (graves, medios, agudos)
+        if bass >= mids and bass >= treble:
+            r, g, b = self._BASS_COLOR
+        elif mids >= treble:
+            r, g, b = self._MIDS_COLOR
         else:
-            base_color = (255, 180, 50) 
-
-        r, g, b = [int(c * 0.8) for c in base_color]
+            r, g, b = self._TREBLE_COLOR
 
         # CÁLCULO INTELIGENTE DE ENERGÍA
         if bass > 0.3:
@@ -217,14 +368,20 @@ class SpectrumPulseMapper:
         if amplitude is not None:
             energy = (energy * 0.7) + (amplitude * 0.3)
 
-        power = (1.0 / self.brightness_emphasis) / self.sensitivity if self.sensitivity > 0 else (1.0 / self.brightness_emphasis)
-        brightness_range = self.max_brightness - self.min_brightness
-        brightness = int(np.clip(self.min_brightness + (energy**power) * brightness_range, self.min_brightness, self.max_brightness))
+        brightness = int(_clip(self.min_brightness + (energy**self._power) * self._brightness_range, self.min_brightness, self.max_brightness))
 
         return r, g, b, brightness
 
 
 class SimplePulseMapper:
+    # Base colors indexed by _dominant_band (bass, treble, mids)
+    _PALETTE = ((255, 40, 40), (50, 100, 255), (60, 255, 80))
+
+    __slots__ = (
+        "min_b", "max_b", "peak_decay", "gamma", "noise_gate", "max_step", "_curve_lut",
+        "_peak", "_prev_b", "_last_rgb",
+    )
+
     def __init__(self, min_brightness=10, max_brightness=70, peak_decay=0.985, gamma=0.9, noise_gate=0.05, max_step=8):
         self.min_b = int(min_brightness)
         self.max_b = int(max_brightness)
@@ -232,14 +389,13 @@ class SimplePulseMapper:
         self.gamma = float(gamma)
         self.noise_gate = float(noise_gate)
         self.max_step = int(max_step)
+        self._curve_lut = _curve_lut(self.min_b, self.max_b, self.gamma)
         self._peak = 0.2
         self._prev_b = self.min_b
         self._last_rgb = (220, 120, 60)
 
     def _pick_color(self, bass, mids, treble):
-        if bass >= mids and bass >= treble: base = (255, 40, 40)
-        elif treble >= mids: base = (50, 100, 255)
-        else: base = (60, 255, 80)
+        base = self._PALETTE[_dominant_band(bass, mids, treble)]
         r = int(0.8 * base[0] + 0.2 * self._last_rgb[0])
         g = int(0.8 * base[1] + 0.2 * self._last_rgb[1])
         b = int(0.8 * base[2] + 0.2 * self._last_rgb[2])
@@ -247,24 +403,30 @@ class SimplePulseMapper:
         return self._last_rgb
 
     def map(self, bass, mids, treble, amplitude):
-        level = float(np.clip(amplitude, 0.0, 1.0))
+        level = float(_clip(amplitude, 0.0, 1.0))
         self._peak = max(level, self._peak * self.peak_decay)
 
-        if self._peak <= 1e-6 or level < self.noise_gate * self._peak:
-            target_b = self.min_b
-        else:
-            norm = np.clip(level / (self._peak + 1e-6), 0.0, 1.0)
-            shaped = norm**self.gamma
-            target_b = int(self.min_b + shaped * (self.max_b - self.min_b))
+        # Silent and already at the floor: brightness stays at min_b, keep the last color
+        if self._prev_b == self.min_b and _is_gated(level, self._peak, self.noise_gate):
+            r, g, b = self._last_rgb
+            return r, g, b, self.min_b
 
-        delta = np.clip(target_b - self._prev_b, -self.max_step, self.max_step)
-        brightness = int(np.clip(self._prev_b + delta, self.min_b, self.max_b))
+        brightness = _pulse_step(level, self._peak, self._prev_b, self.noise_gate, self.min_b, self.max_b, self.max_step, self._curve_lut)
         self._prev_b = brightness
         r, g, b = self._pick_color(bass, mids, treble)
         return r, g, b, brightness
 
 
 class StereoSplitMapper:
+    # Warm (bass side) and cool (treble side) palettes, from most to least dominant
+    _WARM_COLORS = ((255, 60, 30), (255, 120, 40), (255, 200, 80))
+    _COOL_COLORS = ((80, 100, 255), (80, 180, 255), (100, 255, 200))
+
+    __slots__ = (
+        "min_b", "max_b", "peak_decay", "gamma", "noise_gate", "max_step", "_curve_lut",
+        "_peak", "_prev_b1", "_prev_b2",
+    )
+
     def __init__(self, min_brightness=10, max_brightness=70, peak_decay=0.985, gamma=0.9, noise_gate=0.05, max_step=8):
         self.min_b = int(min_brightness)
         self.max_b = int(max_brightness)
@@ -272,43 +434,34 @@ class StereoSplitMapper:
         self.gamma = float(gamma)
         self.noise_gate = float(noise_gate)
         self.max_step = int(max_step)
+        self._curve_lut = _curve_lut(self.min_b, self.max_b, self.gamma)
         self._peak = 0.2
         self._prev_b1 = self.min_b
         self._prev_b2 = self.min_b
 
     def map_lights(self, bass, mids, treble, num_lights=2):
         warm_energy = bass * 0.6 + mids * 0.4
-        if bass > mids * 1.2: color1 = (255, 60, 30)
-        elif bass > mids * 0.8: color1 = (255, 120, 40)
-        else: color1 = (255, 200, 80)
+        color1 = self._WARM_COLORS[0 if bass > mids * 1.2 else 1 if bass > mids * 0.8 else 2]
 
         cool_energy = mids * 0.4 + treble * 0.6
-        if treble > mids * 1.2: color2 = (80, 100, 255)
-        elif treble > mids * 0.8: color2 = (80, 180, 255)
-        else: color2 = (100, 255, 200)
 
-        level1 = float(np.clip(warm_energy, 0.0, 1.0))
-        level2 = float(np.clip(cool_energy, 0.0, 1.0))
+        level1 = float(_clip(warm_energy, 0.0, 1.0))
+        level2 = float(_clip(cool_energy, 0.0, 1.0))
         self._peak = max(max(level1, level2), self._peak * self.peak_decay)
 
-        if self._peak <= 1e-6 or level1 < self.noise_gate * self._peak: target_b1 = self.min_b
-        else:
-            norm1 = np.clip(level1 / (self._peak + 1e-6), 0.0, 1.0)
-            shaped1 = norm1**self.gamma
-            target_b1 = int(self.min_b + shaped1 * (self.max_b - self.min_b))
-
-        delta1 = np.clip(target_b1 - self._prev_b1, -self.max_step, self.max_step)
-        brightness1 = int(np.clip(self._prev_b1 + delta1, self.min_b, self.max_b))
+        # A single light only needs the warm side (the shared peak still tracks both)
+        if num_lights < 2:
+            if self._prev_b1 == self.min_b and _is_gated(level1, self._peak, self.noise_gate): brightness1 = self.min_b
+            else: brightness1 = _pulse_step(level1, self._peak, self._prev_b1, self.noise_gate, self.min_b, self.max_b, self.max_step, self._curve_lut)
+            self._prev_b1 = brightness1
+            return [(color1[0], color1[1], color1[2], brightness1)]
+
+        color2 = self._COOL_COLORS[0 if treble > mids * 1.2 else 1 if treble > mids * 0.8 else 2]
+        brightness1, brightness2 = _pulse_pair(
+            level1, level2, self._peak, self._peak, self._prev_b1, self._prev_b2, self.noise_gate,
+            self.min_b, self.max_b, self.max_step, self.max_step, self._curve_lut, self._curve_lut,
+        )
         self._prev_b1 = brightness1
-
-        if self._peak <= 1e-6 or level2 < self.noise_gate * self._peak: target_b2 = self.min_b
-        else:
-            norm2 = np.clip(level2 / (self._peak + 1e-6), 0.0, 1.0)
-            shaped2 = norm2**self.gamma
-            target_b2 = int(self.min_b + shaped2 * (self.max_b - self.min_b))
-
-        delta2 = np.clip(target_b2 - self._prev_b2, -self.max_step, self.max_step)
-        brightness2 = int(np.clip(self._prev_b2 + delta2, self.min_b, self.max_b))
         self._prev_b2 = brightness2
 
         return [(color1[0], color1[1], color1[2], brightness1), (color2[0], color2[1], color2[2], brightness2)]
@@ -319,6 +472,15 @@ class StereoSplitMapper:
 
 
 class ComplementaryPulseMapper:
+    # Main colors indexed by _dominant_band (bass, treble, mids) and their 255 - c complements
+    _MAIN_COLORS = ((255, 50, 50), (50, 100, 255), (80, 255, 100))
+    _COMP_COLORS = ((0, 205, 205), (205, 155, 0), (175, 0, 155))
+
+    __slots__ = (
+        "min_b", "max_b", "peak_decay", "gamma", "noise_gate", "max_step", "_curve_lut",
+        "_peak", "_prev_b",
+    )
+
     def __init__(self, min_brightness=15, max_brightness=70, peak_decay=0.985, gamma=0.9, noise_gate=0.05, max_step=8):
         self.min_b = int(min_brightness)
         self.max_b = int(max_brightness)
@@ -326,34 +488,28 @@ class ComplementaryPulseMapper:
         self.gamma = float(gamma)
         self.noise_gate = float(noise_gate)
         self.max_step = int(max_step)
+        self._curve_lut = _curve_lut(self.min_b, self.max_b, self.gamma)
         self._peak = 0.2
         self._prev_b = self.min_b
 
-    def _get_complementary_color(self, r, g, b):
-        return (255 - r, 255 - g, 255 - b)
-
     def map_lights(self, bass, mids, treble, num_lights=2):
         total_energy = bass + mids + treble
         if total_energy < 1e-6: total_energy = 1e-6
 
-        if bass >= mids and bass >= treble: main_color = (255, 50, 50)
-        elif treble >= mids: main_color = (50, 100, 255)
-        else: main_color = (80, 255, 100)
-
-        comp_color = self._get_complementary_color(*main_color)
-        level = float(np.clip(total_energy / 3.0, 0.0, 1.0))
+        dominant = _dominant_band(bass, mids, treble)
+        main_color = self._MAIN_COLORS[dominant]
+        level = float(_clip(total_energy / 3.0, 0.0, 1.0))
         self._peak = max(level, self._peak * self.peak_decay)
 
-        if self._peak <= 1e-6 or level < self.noise_gate * self._peak: target_b = self.min_b
-        else:
-            norm = np.clip(level / (self._peak + 1e-6), 0.0, 1.0)
-            shaped = norm**self.gamma
-            target_b = int(self.min_b + shaped * (self.max_b - self.min_b))
-
-        delta = np.clip(target_b - self._prev_b, -self.max_step, self.max_step)
-        brightness_main = int(np.clip(self._prev_b + delta, self.min_b, self.max_b))
+        if self._prev_b == self.min_b and _is_gated(level, self._peak, self.noise_gate): brightness_main = self.min_b
+        else: brightness_main = _pulse_step(level, self._peak, self._prev_b, self.noise_gate, self.min_b, self.max_b, self.max_step, self._curve_lut)
         self._prev_b = brightness_main
-        brightness_comp = int(np.clip(self.max_b - (brightness_main - self.min_b), self.min_b, self.max_b))
+
+        if num_lights < 2:
+            return [(main_color[0], main_color[1], main_color[2], brightness_main)]
+
+        comp_color = self._COMP_COLORS[dominant]
+        brightness_comp = int(_clip(self.max_b - (brightness_main - self.min_b), self.min_b, self.max_b))
 
         return [(main_color[0], main_color[1], main_color[2], brightness_main), (comp_color[0], comp_color[1], comp_color[2], brightness_comp)]
 
@@ -363,6 +519,15 @@ class ComplementaryPulseMapper:
 
 
 class BeatLeaderFollowerMapper:
+    # Follower colors indexed by _dominant_band (bass, treble, mids)
+    _FOLLOWER_COLORS = ((255, 60, 60), (80, 120, 255), (80, 255, 120))
+
+    __slots__ = (
+        "min_b", "max_b", "peak_decay", "gamma", "noise_gate", "max_step", "_curve_lut",
+        "_follower_lut", "delay_frames", "_peak", "_prev_b1", "_prev_b2", "_history",
+        "_last_color",
+    )
+
     def __init__(self, min_brightness=10, max_brightness=70, peak_decay=0.985, gamma=0.7, noise_gate=0.05, max_step=15, delay_frames=4):
         self.min_b = int(min_brightness)
         self.max_b = int(max_brightness)
@@ -370,53 +535,47 @@ class BeatLeaderFollowerMapper:
         self.gamma = float(gamma)
         self.noise_gate = float(noise_gate)
         self.max_step = int(max_step)
+        self._curve_lut = _curve_lut(self.min_b, self.max_b, self.gamma)
+        self._follower_lut = _curve_lut(self.min_b, self.max_b, 1.1)
         self.delay_frames = delay_frames
         self._peak = 0.2
         self._prev_b1 = self.min_b
         self._prev_b2 = self.min_b
-        self._history = []
+        self._history = deque(maxlen=self.delay_frames)
         self._last_color = (60, 255, 80)
 
     def map_lights(self, bass, mids, treble, num_lights=2):
         total_energy = bass + mids + treble
-        level = float(np.clip(total_energy / 3.0, 0.0, 1.0))
+        level = float(_clip(total_energy / 3.0, 0.0, 1.0))
+
+        leader_color = (255, 240, 220)
+        self._peak = max(level, self._peak * self.peak_decay)
+
+        # Without a second light there is no follower to color or delay
+        if num_lights < 2:
+            if self._prev_b1 == self.min_b and _is_gated(level, self._peak, self.noise_gate): brightness1 = self.min_b
+            else: brightness1 = _pulse_step(level, self._peak, self._prev_b1, self.noise_gate, self.min_b, self.max_b, self.max_step, self._curve_lut)
+            self._prev_b1 = brightness1
+            return [(leader_color[0], leader_color[1], leader_color[2], brightness1)]
 
-        if bass >= mids and bass >= treble: follower_color = (255, 60, 60)
-        elif treble >= mids: follower_color = (80, 120, 255)
-        else: follower_color = (80, 255, 120)
+        follower_color = self._FOLLOWER_COLORS[_dominant_band(bass, mids, treble)]
 
         r = int(0.7 * follower_color[0] + 0.3 * self._last_color[0])
         g = int(0.7 * follower_color[1] + 0.3 * self._last_color[1])
         b = int(0.7 * follower_color[2] + 0.3 * self._last_color[2])
         self._last_color = (r, g, b)
 
-        leader_color = (255, 240, 220)
-        self._peak = max(level, self._peak * self.peak_decay)
-
-        if self._peak <= 1e-6 or level < self.noise_gate * self._peak: target_b1 = self.min_b
-        else:
-            norm = np.clip(level / (self._peak + 1e-6), 0.0, 1.0)
-            shaped = norm**self.gamma
-            target_b1 = int(self.min_b + shaped * (self.max_b - self.min_b))
-
-        delta1 = np.clip(target_b1 - self._prev_b1, -self.max_step, self.max_step)
-        brightness1 = int(np.clip(self._prev_b1 + delta1, self.min_b, self.max_b))
-        self._prev_b1 = brightness1
-
+        # The deque drops the oldest frame itself once delay_frames are stored
         self._history.append((level, r, g, b))
-        if len(self._history) > self.delay_frames: self._history.pop(0)
 
-        if len(self._history) >= self.delay_frames: delayed_level, delayed_r, delayed_g, delayed_b = self._history[0]
+        if len(self._history) == self.delay_frames: delayed_level, delayed_r, delayed_g, delayed_b = self._history[0]
         else: delayed_level, delayed_r, delayed_g, delayed_b = level, r, g, b
 
-        if self._peak <= 1e-6 or delayed_level < self.noise_gate * self._peak: target_b2 = self.min_b
-        else:
-            norm2 = np.clip(delayed_level / (self._peak + 1e-6), 0.0, 1.0)
-            shaped2 = norm2**1.1
-            target_b2 = int(self.min_b + shaped2 * (self.max_b - self.min_b))
-
-        delta2 = np.clip(target_b2 - self._prev_b2, -5, 5)
-        brightness2 = int(np.clip(self._prev_b2 + delta2, self.min_b, self.max_b))
+        brightness1, brightness2 = _pulse_pair(
+            level, delayed_level, self._peak, self._peak, self._prev_b1, self._prev_b2, self.noise_gate,
+            self.min_b, self.max_b, self.max_step, 5, self._curve_lut, self._follower_lut,
+        )
+        self._prev_b1 = brightness1
         self._prev_b2 = brightness2
 
         return [(leader_color[0], leader_color[1], leader_color[2], brightness1), (delayed_r, delayed_g, delayed_b, brightness2)]
@@ -427,6 +586,11 @@ class BeatLeaderFollowerMapper:
 
 
 class FrequencyDanceMapper:
+    __slots__ = (
+        "min_b", "max_b", "peak_decay", "gamma", "noise_gate", "max_step", "_curve_lut",
+        "_peak", "_prev_b1", "_prev_b2",
+    )
+
     def __init__(self, min_brightness=15, max_brightness=70, peak_decay=0.985, gamma=0.9, noise_gate=0.05, max_step=8):
         self.min_b = int(min_brightness)
         self.max_b = int(max_brightness)
@@ -434,6 +598,7 @@ class FrequencyDanceMapper:
         self.gamma = float(gamma)
         self.noise_gate = float(noise_gate)
         self.max_step = int(max_step)
+        self._curve_lut = _curve_lut(self.min_b, self.max_b, self.gamma)
         self._peak = 0.2
         self._prev_b1 = self.min_b
         self._prev_b2 = self.min_b
@@ -447,34 +612,31 @@ class FrequencyDanceMapper:
         dominance = treble_weight / (bass_weight + treble_weight) if (bass_weight + treble_weight) > 0 else 0.5
 
         bass_influence = 1.0 - dominance
-        color1_r = int(np.clip(180 + bass_influence * 75, 80, 255))
-        color1_g = int(np.clip(50 + (1 - abs(dominance - 0.5) * 2) * 80, 50, 130))
-        color1_b = int(np.clip(50 + (1 - bass_influence) * 100, 50, 150))
-
-        treble_influence = dominance
-        color2_r = int(np.clip(80 + (1 - treble_influence) * 100, 50, 180))
-        color2_g = int(np.clip(80 + (1 - abs(dominance - 0.5) * 2) * 80, 80, 160))
-        color2_b = int(np.clip(150 + treble_influence * 105, 150, 255))
+        color1_r = int(_clip(180 + bass_influence * 75, 80, 255))
+        color1_g = int(_clip(50 + (1 - abs(dominance - 0.5) * 2) * 80, 50, 130))
+        color1_b = int(_clip(50 + (1 - bass_influence) * 100, 50, 150))
 
-        level = float(np.clip(total_energy / 3.0, 0.0, 1.0))
+        level = float(_clip(total_energy / 3.0, 0.0, 1.0))
         self._peak = max(level, self._peak * self.peak_decay)
 
-        if self._peak <= 1e-6 or level < self.noise_gate * self._peak: base_brightness = self.min_b
-        else:
-            norm = np.clip(level / (self._peak + 1e-6), 0.0, 1.0)
-            shaped = norm**self.gamma
-            base_brightness = int(self.min_b + shaped * (self.max_b - self.min_b))
+        base_brightness = _pulse_target(level, self._peak, self.noise_gate, self.min_b, self._curve_lut)
 
         brightness_range = base_brightness - self.min_b
         target_b1 = int(self.min_b + brightness_range * (1.0 - dominance))
-        target_b2 = int(self.min_b + brightness_range * dominance)
 
-        delta1 = np.clip(target_b1 - self._prev_b1, -self.max_step, self.max_step)
-        brightness1 = int(np.clip(self._prev_b1 + delta1, self.min_b, self.max_b))
+        brightness1 = _slew(target_b1, self._prev_b1, self.max_step, self.min_b, self.max_b)
         self._prev_b1 = brightness1
 
-        delta2 = np.clip(target_b2 - self._prev_b2, -self.max_step, self.max_step)
-        brightness2 = int(np.clip(self._prev_b2 + delta2, self.min_b, self.max_b))
+        if num_lights < 2:
+            return [(color1_r, color1_g, color1_b, brightness1)]
+
+        treble_influence = dominance
+        color2_r = int(_clip(80 + (1 - treble_influence) * 100, 50, 180))
+        color2_g = int(_clip(80 + (1 - abs(dominance - 0.5) * 2) * 80, 80, 160))
+        color2_b = int(_clip(150 + treble_influence * 105, 150, 255))
+        target_b2 = int(self.min_b + brightness_range * dominance)
+
+        brightness2 = _slew(target_b2, self._prev_b2, self.max_step, self.min_b, self.max_b)
         self._prev_b2 = brightness2
 
         return [(color1_r, color1_g, color1_b, brightness1), (color2_r, color2_g, color2_b, brightness2)]
@@ -488,6 +650,11 @@ class SpectrumGradientMapper:
     """
     🌊 Spectrum gradient mapper - visual frequency gradient.
     """
+    __slots__ = (
+        "min_b", "max_b", "peak_decay", "gamma", "noise_gate", "max_step", "_curve_lut",
+        "_peak_low", "_peak_high", "_prev_b1", "_prev_b2",
+    )
+
     def __init__(self, min_brightness=10, max_brightness=70, peak_decay=0.985, gamma=0.9, noise_gate=0.05, max_step=8):
         self.min_b = int(min_brightness)
         self.max_b = int(max_brightness)
@@ -495,6 +662,7 @@ class SpectrumGradientMapper:
         self.gamma = float(gamma)
         self.noise_gate = float(noise_gate)
         self.max_step = int(max_step)
+        self._curve_lut = _curve_lut(self.min_b, self.max_b, self.gamma)
         self._peak_low = 0.2
         self._peak_high = 0.2
         self._prev_b1 = self.min_b
@@ -505,33 +673,28 @@ class SpectrumGradientMapper:
         if bass > mids: color1 = (255, int(40 + bass * 80), 30)
         else: color1 = (255, int(100 + mids * 100), 50)
 
+        level_low = float(_clip(low_energy, 0.0, 1.0))
+        self._peak_low = max(level_low, self._peak_low * self.peak_decay)
+
+        # The high side has its own peak, so a single light can skip it entirely
+        if num_lights < 2:
+            if self._prev_b1 == self.min_b and _is_gated(level_low, self._peak_low, self.noise_gate): brightness1 = self.min_b
+            else: brightness1 = _pulse_step(level_low, self._peak_low, self._prev_b1, self.noise_gate, self.min_b, self.max_b, self.max_step, self._curve_lut)
+            self._prev_b1 = brightness1
+            return [(color1[0], color1[1], color1[2], brightness1)]
+
         high_energy = treble + mids * 0.3
         if treble > mids: color2 = (int(60 + treble * 40), int(80 + treble * 100), 255)
         else: color2 = (int(120 + mids * 80), int(80 + mids * 120), 255)
 
-        level_low = float(np.clip(low_energy, 0.0, 1.0))
-        level_high = float(np.clip(high_energy, 0.0, 1.0))
-        self._peak_low = max(level_low, self._peak_low * self.peak_decay)
+        level_high = float(_clip(high_energy, 0.0, 1.0))
         self._peak_high = max(level_high, self._peak_high * self.peak_decay)
 
-        if self._peak_low <= 1e-6 or level_low < self.noise_gate * self._peak_low: target_b1 = self.min_b
-        else:
-            norm1 = np.clip(level_low / (self._peak_low + 1e-6), 0.0, 1.0)
-            shaped1 = norm1**self.gamma
-            target_b1 = int(self.min_b + shaped1 * (self.max_b - self.min_b))
-
-        delta1 = np.clip(target_b1 - self._prev_b1, -self.max_step, self.max_step)
-        brightness1 = int(np.clip(self._prev_b1 + delta1, self.min_b, self.max_b))
+        brightness1, brightness2 = _pulse_pair(
+            level_low, level_high, self._peak_low, self._peak_high, self._prev_b1, self._prev_b2, self.noise_gate,
+            self.min_b, self.max_b, self.max_step, self.max_step, self._curve_lut, self._curve_lut,
+        )
         self._prev_b1 = brightness1
-
-        if self._peak_high <= 1e-6 or level_high < self.noise_gate * self._peak_high: target_b2 = self.min_b
-        else:
-            norm2 = np.clip(level_high / (self._peak_high + 1e-6), 0.0, 1.0)
-            shaped2 = norm2**self.gamma
-            target_b2 = int(self.min_b + shaped2 * (self.max_b - self.min_b))
-
-        delta2 = np.clip(target_b2 - self._prev_b2, -self.max_step, self.max_step)
-        brightness2 = int(np.clip(self._prev_b2 + delta2, self.min_b, self.max_b))
         self._prev_b2 = brightness2
 
         return [(color1[0], color1[1], color1[2], brightness1), (color2[0], color2[1], color2[2], brightness2)]
@@ -541,22 +704,49 @@ class SpectrumGradientMapper:
         return colors[0]
 
 
+def _hsv_to_rgb_fast(h, s, v):
+    """HSV (0-1) -> 0-255 RGB ints with the closed form f(n) = v - v*s*max(0, min(k, 4-k, 1))."""
+    rgb = []
+    for n in (5, 3, 1):
+        k = (n + h * 6) % 6
+        rgb.append(int((v - v * s * max(0.0, min(k, 4 - k, 1.0))) * 255))
+    return rgb[0], rgb[1], rgb[2]
+
+
+_HSV_OFFSETS = np.array([5.0, 3.0, 1.0])
+
+
+def _hsv_to_rgb_array(h, s, v):
+    """_hsv_to_rgb_fast over an array of hues: (len(h), 3) int array of 0-255 RGB."""
+    k = (_HSV_OFFSETS + h[:, None] * 6) % 6
+    f = np.clip(np.minimum(np.minimum(k, 4 - k), 1.0), 0.0, None)
+    return ((v - v * s * f) * 255).astype(np.int64)
+
+
 class TurboSpectrumGradient:
     """
     Versión 'Groove + Kick':
     - Fluye suave en las partes tranquilas.
     - Detecta el 'Estribillo' (Energía alta en Medios/Agudos) para dar un Flash.
     """
+    __slots__ = (
+        "min_brightness", "max_brightness", "hue_offset", "last_update", "smoothed_brightness",
+    )
+
     def __init__(self, min_brightness=10, max_brightness=100, **kwargs):
         self.min_brightness = min_brightness
         self.max_brightness = max_brightness
         self.hue_offset = 0.0
-        self.last_update = time.time()
+        self.last_update = time.monotonic_ns()
         self.smoothed_brightness = min_brightness
 
-    def _get_rgb_brightness(self, bass, mids, treble, amp):
-        now = time.time()
-        dt = now - self.last_update
+    # Con menos luces el bucle escalar es más rápido que NumPy
+    _VECTOR_MIN_LIGHTS = 12
+
+    def _get_hsv_brightness(self, bass, mids, treble, amp):
+        now = time.monotonic_ns()
+        # Reloj monotónico: un ajuste de hora no provoca saltos; tras una pausa no se recupera de golpe
+        dt = min((now - self.last_update) * 1e-9, 0.1)
         self.last_update = now
 
         # 1. MOVIMIENTO (BAILE)
@@ -588,9 +778,11 @@ class TurboSpectrumGradient:
         self.smoothed_brightness = (self.smoothed_brightness * (1-alpha)) + (target_brightness * alpha)
         final_brightness = int(self.smoothed_brightness)
 
-        r, g, b = colorsys.hsv_to_rgb(hue, saturation, 1.0)
-        r, g, b = int(r * 255), int(g * 255), int(b * 255)
+        return hue, saturation, final_brightness
 
+    def _get_rgb_brightness(self, bass, mids, treble, amp):
+        hue, saturation, final_brightness = self._get_hsv_brightness(bass, mids, treble, amp)
+        r, g, b = _hsv_to_rgb_fast(hue, saturation, 1.0)
         return r, g, b, final_brightness
 
     def map(self, bass, mids, treble, amp):
@@ -599,14 +791,20 @@ class TurboSpectrumGradient:
 
     def map_lights(self, bass, mids, treble, num_lights):
         colors = []
-        r, g, b, bri = self._get_rgb_brightness(bass, mids, treble, (bass+mids+treble)/3)
-        h, s, v = colorsys.rgb_to_hsv(r/255, g/255, b/255)
+        # El tono y la saturación ya se conocen: sin ida y vuelta por RGB
+        h, s, bri = self._get_hsv_brightness(bass, mids, treble, (bass+mids+treble)/3)
+        v = 1.0
+
+        if num_lights >= self._VECTOR_MIN_LIGHTS:
+            hues = h + np.arange(num_lights) * 0.05
+            hues = np.where(hues > 1.0, hues - 1.0, hues)
+            return [[lr, lg, lb, bri] for lr, lg, lb in _hsv_to_rgb_array(hues, s, v).tolist()]
 
         for i in range(num_lights):
             local_h = h + (i * 0.05)
             if local_h > 1.0: local_h -= 1.0
 
-            lr, lg, lb = colorsys.hsv_to_rgb(local_h, s, v)
-            colors.append([int(lr*255), int(lg*255), int(lb*255), bri])
+            lr, lg, lb = _hsv_to_rgb_fast(local_h, s, v)
+            colors.append([lr, lg, lb, bri])
 
         return colors
\ No newline at end of file
@@ -2,6 +2,7 @@
 Internationalization Manager (i18n)
 Detects system locale and serves the appropriate language strings.
 """
+import functools
 import locale
 import os
 import sys
@@ -77,12 +78,19 @@ TRANSLATIONS = {
     "autodj_stopped": {"en": "\n\n👋 Auto DJ stopped.", "es": "\n\n👋 Auto DJ detenido correctamente."},
 }
 
+# Environment variables checked for the UI language, in POSIX priority order
+LOCALE_ENV_VARS = ("LC_ALL", "LC_MESSAGES", "LANG", "LANGUAGE")
+
 def get_system_language():
     """Detects system language, defaults to 'en'."""
     try:
-        # Get default locale (e.g., ('es_ES', 'cp1252'))
-        lang_code = locale.getdefaultlocale()[0]
-        if lang_code and 'es' in lang_code.lower():
+        # Fast path: the locale environment variables (e.g. 'es_ES.UTF-8')
+        lang_code = next((os.environ[v] for v in LOCALE_ENV_VARS if os.environ.get(v)), None)
+        if lang_code is None:
+            # No env locale (typical on Windows): ask the C runtime,
+            # e.g. ('es_ES', 'UTF-8') or ('Spanish_Spain', '1252')
+            lang_code = locale.getlocale()[0]
+        if lang_code and ('es' in lang_code.lower() or 'spanish' in lang_code.lower()):
             return 'es'
         return 'en'
     except:
@@ -91,17 +99,28 @@ def get_system_language():
 # Global variable to store detected language
 CURRENT_LANG = get_system_language()
 
+# Strings of the active language, resolved once: key -> text
+_ACTIVE = {key: entry.get(CURRENT_LANG, entry.get("en", key)) for key, entry in TRANSLATIONS.items()}
+
+@functools.lru_cache(maxsize=256, typed=True)
+def _format(text, args, arg_types):
+    # arg_types keys the cache: 1, 1.0 and True are equal but format differently
+    try:
+        return text.format(*args)
+    except Exception:
+        return text
+
 def t(key, *args):
     """
     Translates a key to the current system language.
     Supports format arguments (like .format()).
     """
-    entry = TRANSLATIONS.get(key, {})
-    text = entry.get(CURRENT_LANG, entry.get("en", key))
+    text = _ACTIVE.get(key, key)
     
     if args:
         try:
-            return text.format(*args)
-        except:
-            return text
+            return _format(text, args, tuple(map(type, args)))
+        except TypeError:
+            # Unhashable arguments cannot be cached
+            return _format.__wrapped__(text, args, None)
     return text
@@ -15,14 +15,13 @@ import sys
 import argparse
 import time
 import threading
-import queue
 import logging
-from concurrent.futures import ThreadPoolExecutor
+from collections import deque
 
 from wiz_control import WizLight
 from audio_analysis import AudioAnalyzer
 from color_mapping import (
-    FrequencyToRGBMapper,
+    make_freq_rgb_mapper,
     MultiLightMapper,
     PulseModeMapper,
     StrobeModeMapper,
@@ -33,12 +32,34 @@ from color_mapping import (
     BeatLeaderFollowerMapper,
     FrequencyDanceMapper,
     TurboSpectrumGradient, # <--- AHORA LO IMPORTAMOS CORRECTAMENTE
+    to_color_array,
 )
 
 # Logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 logger = logging.getLogger("music_visualizer")
 
+# Chunks de 50 ms que caben en el ring del callback de audio (~200 ms de margen)
+RING_CHUNKS = 4
+# Frames de color programados como máximo (el ring + latencia del dispositivo caben de sobra)
+MAX_SCHEDULED = 32
+# Buffers que rota el hilo decodificador (uno en uso por el bucle principal y el resto en cola)
+DECODE_BUFFERS = 4
+
+# Refresco máximo de la pantalla de progreso (s) y barras precalculadas
+UI_INTERVAL = 0.1
+BAR_LENGTH = 40
+_FULL = "█" * BAR_LENGTH
+_EMPTY = "░" * BAR_LENGTH
+
+RED = "\033[91m"
+GREEN = "\033[92m"
+BLUE = "\033[94m"
+YELLOW = "\033[93m"
+CYAN = "\033[96m"
+RESET = "\033[0m"
+K = "\033[K"
+
 
 class MusicVisualizer:
     """Music file visualizer with perfect audio-light sync."""
@@ -55,26 +76,50 @@ class MusicVisualizer:
     ):
         self.audio_file = audio_file
         self.light_ips = light_ips
-        self.lights = [WizLight(ip) for ip in light_ips]
+        # Los frames salen por WizLight.set_colors_bulk: basta con las IPs y cuántas son
+        self.num_lights = len(light_ips)
         self.mode = mode
         self.loop = loop
         self.running = False
         self.paused = False
 
-        # Load audio file
+        # Open audio file: decoded block by block, the whole song is never held in RAM
         print(f"Loading audio file: {audio_file}")
-        self.audio_data, self.sample_rate = sf.read(audio_file, always_2d=True)
-
-        if self.audio_data.shape[1] > 1:
-            self.audio_data = np.mean(self.audio_data, axis=1)
-        else:
-            self.audio_data = self.audio_data[:, 0]
+        self._sf = sf.SoundFile(audio_file)
+        self.sample_rate = self._sf.samplerate
 
-        self.total_samples = len(self.audio_data)
+        # Para MP3 el número de frames es una estimación de la cabecera; el final real
+        # lo marca una lectura corta
+        self.total_samples = self._sf.frames
         self.duration = self.total_samples / self.sample_rate
 
         print(f"✅ Loaded: {self.duration:.1f} seconds, {self.sample_rate} Hz")
 
+        # Chunks de 50 ms con la forma (n, 1) que espera el stream
+        self.chunk_size = int(self.sample_rate * 0.05)
+
+        # Hilo decodificador -> bucle principal: buffers preasignados que rotan y una cola
+        # de (buffer, frames, posición). libsndfile suelta el GIL mientras decodifica,
+        # así que el siguiente chunk se decodifica mientras analizamos el actual.
+        self._decode_bufs = np.zeros((DECODE_BUFFERS, self.chunk_size, 1), dtype=np.float32)
+        self._decoded = deque()
+        self._decoded_ready = threading.Event()
+        self._decoded_space = threading.Event()
+        self._decoder_thread = None
+
+        # Ring SPSC entre el bucle principal (productor) y el callback de audio (consumidor).
+        # Cada contador lo escribe un solo hilo, así que no hace falta lock.
+        self._ring = np.zeros((RING_CHUNKS * self.chunk_size, 1), dtype=np.float32)
+        self._ring_write = 0
+        self._ring_read = 0
+        self._ring_space = threading.Event()
+
+        # Los ficheros mono se leen directamente en los buffers de decodificación
+        if self._sf.channels > 1:
+            self._read_buf = np.empty((self.chunk_size, self._sf.channels), dtype=np.float32)
+        else:
+            self._read_buf = None
+
         # Audio analysis
         self.analyzer = AudioAnalyzer(
             sample_rate=self.sample_rate,
@@ -105,14 +150,16 @@ class MusicVisualizer:
             print("🎤 Modo Groove + Vocal Kick Activado")
             self.mapper = TurboSpectrumGradient(min_brightness=10, max_brightness=100)
         else:
-            self.mapper = FrequencyToRGBMapper(mode=mode, brightness_boost=brightness_boost)
+            self.mapper = make_freq_rgb_mapper(mode=mode, brightness_boost=brightness_boost)
 
-        # --- Cola optimizada ---
-        self.color_queue = queue.Queue(maxsize=1)
+        # --- Frames de color (hora de reproducción, colores), en orden de reproducción ---
+        # Un productor / un consumidor: append y popleft de deque son atómicos
+        self._frames = deque(maxlen=MAX_SCHEDULED)
+        self._cv = threading.Event()
+        self._out_latency = 0.0
 
         # --- Worker thread con parada limpia ---
         self._stop_event = threading.Event()
-        self._executor = ThreadPoolExecutor(max_workers=len(self.lights))
         self.update_thread = threading.Thread(target=self._light_update_worker, daemon=False)
         self.update_thread.start()
 
@@ -120,62 +167,134 @@ class MusicVisualizer:
         self.min_update_interval = 0.035   # ← PERFECTO para tus 2 bombillas A60 E27 8.5W
         self._last_update_time = 0.0
 
+        self._last_ui = 0.0
         self.current_position = 0
         self.current_bass = 0
         self.current_mids = 0
         self.current_treble = 0
-        self.current_color = (0, 0, 0, 0)
+        self.current_color = np.zeros((self.num_lights, 4), dtype=np.uint8)
 
-    def _enqueue_color_replace(self, colors):
-        try:
-            try:
-                self.color_queue.get_nowait()
-            except:
-                pass
-            self.color_queue.put_nowait(colors)
-        except:
-            pass
+    def _schedule_colors(self, colors, play_at):
+        # play_at (time.monotonic) es cuando suena el chunk del que salen estos colores
+        self._frames.append((play_at, colors))
+        self._cv.set()
 
     def _light_update_worker(self):
+        frames = self._frames
         try:
             while not self._stop_event.is_set():
-                try:
-                    colors = self.color_queue.get(timeout=0.1)
-                except queue.Empty:
+                # Limpiar antes de mirar la cola: si llega un frame entre medias no se pierde
+                self._cv.clear()
+                if not frames:
+                    self._cv.wait(0.1)
                     continue
-
-                futures = []
-                if isinstance(colors, list) and len(colors) == len(self.lights):
-                    for light, col in zip(self.lights, colors):
-                        r, g, b, bri = col
-                        futures.append(self._executor.submit(self._safe_set_color, light, r, g, b, bri))
-                else:
-                    if isinstance(colors, list):
-                        r, g, b, bri = colors[0]
-                    else:
-                        r, g, b, bri = colors
-                    for light in self.lights:
-                        futures.append(self._executor.submit(self._safe_set_color, light, r, g, b, bri))
-
-                for f in futures:
-                    try:
-                        f.result(timeout=0.5)
-                    except:
-                        pass
+                # Esperar a que suene el audio del frame más antiguo
+                delay = frames[0][0] - time.monotonic()
+                if delay > 0:
+                    self._stop_event.wait(delay)
+                    continue
+                # Si vamos tarde, solo se envía el más reciente de los frames ya vencidos
+                now = time.monotonic()
+                _, colors = frames.popleft()
+                while frames and frames[0][0] <= now:
+                    _, colors = frames.popleft()
+
+                # UDP fire & forget: todo el frame en una llamada, desde este hilo
+                sent = WizLight.set_colors_bulk(
+                    (ip, r, g, b, bri) for ip, (r, g, b, bri) in zip(self.light_ips, colors.tolist())
+                )
+                if sent < self.num_lights:
+                    logger.warning(f"set_colors_bulk sent {sent}/{self.num_lights} updates")
         finally:
-            try:
-                self._executor.shutdown(wait=True)
-            except:
-                pass
             logger.info("Light update worker stopped")
 
-    def _safe_set_color(self, light, r, g, b, brightness):
+    def _read_block(self, out, start=0):
+        """Lee frames en out[start:] mezclando a mono; devuelve cuántos leyó."""
+        if self._read_buf is None:
+            return len(self._sf.read(out=out[start:]))
+        block = self._sf.read(out=self._read_buf[start:])
+        n = len(block)
+        np.mean(block, axis=1, out=out[start:start + n, 0])
+        return n
+
+    def _decoder(self):
+        # Hilo productor: decodifica por delante del bucle principal
+        chunk_size = self.chunk_size
+        position = 0
+        i = 0
         try:
-            light.set_color(r, g, b, brightness)
-        except Exception as e:
-            logger.warning(f"set_color failed for {light.ip}: {e}")
+            while self.running:
+                # Espera mientras la cola ocupa todos los buffers libres
+                if len(self._decoded) >= DECODE_BUFFERS - 1:
+                    self._decoded_space.wait(0.05)
+                    self._decoded_space.clear()
+                    continue
 
-    def _process_audio_chunk(self, chunk):
+                out = self._decode_bufs[i]
+                i = (i + 1) % DECODE_BUFFERS
+                n = self._read_block(out)
+                position += n
+                if n < chunk_size:
+                    if not self.loop:
+                        if n:
+                            self._decoded.append((out, n, position))
+                        break
+                    # Vuelta al principio: completar el mismo buffer, sin concatenar
+                    self._sf.seek(0)
+                    position = self._read_block(out, n)
+                    n += position
+                    if n < chunk_size:
+                        break
+                self._decoded.append((out, n, position))
+                self._decoded_ready.set()
+        finally:
+            # Fin del fichero (o parada): avisar al bucle principal
+            self._decoded.append(None)
+            self._decoded_ready.set()
+
+    def _next_block(self):
+        """Siguiente chunk decodificado (buffer, frames, posición) o None al terminar."""
+        while not self._decoded:
+            if not self.running:
+                return None
+            self._decoded_ready.wait(0.05)
+            self._decoded_ready.clear()
+        item = self._decoded.popleft()
+        self._decoded_space.set()
+        return item
+
+    def _ring_push(self, block):
+        """Copia block (n, 1) en el ring, esperando mientras esté lleno."""
+        n = len(block)
+        cap = len(self._ring)
+        while self._ring_write + n - self._ring_read > cap:
+            if not self.running:
+                return
+            self._ring_space.wait(0.05)
+            self._ring_space.clear()
+
+        start = self._ring_write % cap
+        first = min(n, cap - start)
+        self._ring[start:start + first] = block[:first]
+        self._ring[:n - first] = block[first:]
+        self._ring_write += n
+
+    def _audio_cb(self, outdata, frames, time_info, status):
+        # Hilo de audio: solo copias sobre buffers ya reservados, nada de lógica Python pesada
+        cap = len(self._ring)
+        avail = min(frames, self._ring_write - self._ring_read)
+        start = self._ring_read % cap
+        first = min(avail, cap - start)
+        outdata[:first] = self._ring[start:start + first]
+        outdata[first:avail] = self._ring[:avail - first]
+        # Underrun (pausa o bucle principal atrasado): silencio en lugar de glitch
+        outdata[avail:] = 0
+        self._ring_read += avail
+        # Lo siguiente del ring empieza a sonar tras este bloque (silencio incluido) + latencia
+        self._play_mark = (time.monotonic() + frames / self.sample_rate, self._ring_read)
+        self._ring_space.set()
+
+    def _process_audio_chunk(self, chunk, play_at):
         bass, mids, treble = self.analyzer.analyze(chunk)
         amplitude = self.analyzer.get_amplitude(chunk)
 
@@ -188,82 +307,63 @@ class MusicVisualizer:
             "beat_leader_follower", "frequency_dance", "spectrum_gradient"
         ]
 
-        if self.mode in dual_modes and len(self.lights) > 1:
+        if self.mode in dual_modes and self.num_lights > 1:
             if hasattr(self.mapper, "map_lights"):
-                colors = self.mapper.map_lights(bass, mids, treble, len(self.lights))
+                colors = self.mapper.map_lights(bass, mids, treble, self.num_lights)
             else:
                 colors = self.mapper.map(bass, mids, treble, amplitude)
         else:
             colors = self.mapper.map(bass, mids, treble, amplitude)
 
+        colors = to_color_array(colors, self.num_lights)
+
         now = time.time()
         if now - self._last_update_time >= self.min_update_interval:
-            self._enqueue_color_replace(colors)
+            self._schedule_colors(colors, play_at)
             self._last_update_time = now
 
         self.current_color = colors
 
     def _print_progress(self):
+        # La terminal no necesita 20 fps: como mucho 10 refrescos por segundo
+        now = time.monotonic()
+        if now - self._last_ui < UI_INTERVAL:
+            return
+        self._last_ui = now
+
         elapsed = self.current_position / self.sample_rate
         progress = (elapsed / self.duration) * 100
 
-        bar_length = 40
-        filled = int(bar_length * progress / 100)
-        bar = "█" * filled + "░" * (bar_length - filled)
+        filled = int(BAR_LENGTH * progress / 100)
+        bar = _FULL[:filled] + _EMPTY[filled:]
 
         elapsed_str = f"{int(elapsed // 60)}:{int(elapsed % 60):02d}"
         total_str = f"{int(self.duration // 60)}:{int(self.duration % 60):02d}"
 
-        bass_bar = "█" * int(self.current_bass * 10)
-        mids_bar = "█" * int(self.current_mids * 10)
-        treble_bar = "█" * int(self.current_treble * 10)
-
-        try:
-            brightness = 0
-            cc = self.current_color
-            if isinstance(cc, list):
-                if len(cc) > 0 and isinstance(cc[0], (list, tuple)) and len(cc[0]) > 3:
-                    brightness = int(cc[0][3])
-                elif len(cc) > 3 and isinstance(cc[3], (int, float)):
-                    brightness = int(cc[3])
-                else:
-                    first = cc[0] if len(cc) > 0 else None
-                    if isinstance(first, (list, tuple)) and len(first) > 3:
-                        brightness = int(first[3])
-            elif isinstance(cc, (tuple,)):
-                if len(cc) > 3:
-                    brightness = int(cc[3])
-            else:
-                brightness = 0
-        except Exception:
-            brightness = 0
-
-        if brightness < 0:
-            brightness = 0
-        if brightness > 100:
-            brightness = 100
-
-        brightness_bar = "█" * int(brightness / 10)
-
-        RED = "\033[91m"
-        GREEN = "\033[92m"
-        BLUE = "\033[94m"
-        YELLOW = "\033[93m"
-        CYAN = "\033[96m"
-        RESET = "\033[0m"
-        K = "\033[K"
-
-        print("\033[H", end="")
-        print(f"\n🎵 {CYAN}Music Visualizer{RESET}{K}")
-        print(f"File: {self.audio_file}{K}")
-        print(f"Mode: {self.mode}{K}")
-        print(f"\n{bar} {progress:5.1f}%{K}")
-        print(f"Time: {elapsed_str} / {total_str}{K}")
-        print(f"\n{RED}Bass:   {bass_bar:<20}{RESET}{K}")
-        print(f"{GREEN}Mids:   {mids_bar:<20}{RESET}{K}")
-        print(f"{BLUE}Treble: {treble_bar:<20}{RESET}{K}")
-        print(f"{YELLOW}Bright: {brightness_bar:<20} {brightness:3d}%{RESET}{K}")
-        print(f"\nControls: [Space] Pause | [Q] Quit | [R] Restart{K}")
+        bass_bar = _FULL[:int(self.current_bass * 10)]
+        mids_bar = _FULL[:int(self.current_mids * 10)]
+        treble_bar = _FULL[:int(self.current_treble * 10)]
+
+        # Sin luces no hay filas de color: brillo 0
+        brightness = min(int(self.current_color[0, 3]), 100) if len(self.current_color) else 0
+
+        brightness_bar = _FULL[:brightness // 10]
+
+        # Un único write por refresco en lugar de un print por línea
+        sys.stdout.write("".join((
+            "\033[H",
+            f"\n🎵 {CYAN}Music Visualizer{RESET}{K}\n",
+            f"File: {self.audio_file}{K}\n",
+            f"Mode: {self.mode}{K}\n",
+            f"\n{bar} {progress:5.1f}%{K}\n",
+            f"Time: {elapsed_str} / {total_str}{K}\n",
+            f"\n{RED}Bass:   {bass_bar:<20}{RESET}{K}\n",
+            f"{GREEN}Mids:   {mids_bar:<20}{RESET}{K}\n",
+            f"{BLUE}Treble: {treble_bar:<20}{RESET}{K}\n",
+            f"{YELLOW}Bright: {brightness_bar:<20} {brightness:3d}%{RESET}{K}\n",
+            f"\nControls: [Space] Pause | [Q] Quit | [R] Restart{K}\n",
+        )))
+        sys.stdout.flush()
 
     def start(self):
         self.running = True
@@ -273,47 +373,49 @@ class MusicVisualizer:
 
         print("\n🎵 Starting playback...")
         print(f"Mode: {self.mode}")
-        print(f"Lights: {len(self.lights)} connected")
+        print(f"Lights: {self.num_lights} connected")
 
+        self._ring_write = self._ring_read = 0
+        self._play_mark = None
         stream = sd.OutputStream(
             samplerate=self.sample_rate,
             channels=1,
             dtype="float32",
+            blocksize=self.chunk_size,
+            callback=self._audio_cb,
         )
         stream.start()
+        # Latencia de salida del dispositivo: se suma al audio que hay en el ring
+        self._out_latency = stream.latency
+
+        self._decoder_thread = threading.Thread(target=self._decoder, daemon=True)
+        self._decoder_thread.start()
 
         try:
             while self.running:
                 if not self.paused:
-                    chunk_size = int(self.sample_rate * 0.05)
-                    if self.current_position + chunk_size > self.total_samples:
-                        if self.loop:
-                            remaining = chunk_size - (self.total_samples - self.current_position)
-                            chunk = np.concatenate([self.audio_data[self.current_position:], self.audio_data[:remaining]])
-                            self.current_position = remaining
-                        else:
-                            chunk = self.audio_data[self.current_position:]
-                            self.current_position = self.total_samples
-                            arr = chunk.astype("float32")
-                            if arr.ndim == 1:
-                                arr = arr.reshape(-1, 1)
-                            stream.write(arr)
-                            self._process_audio_chunk(chunk)
-                            break
-                    else:
-                        chunk = self.audio_data[self.current_position:self.current_position + chunk_size]
-                        self.current_position += chunk_size
-
-                    arr = chunk.astype("float32")
-                    if arr.ndim == 1:
-                        arr = arr.reshape(-1, 1)
-                    stream.write(arr)
-
-                    self._process_audio_chunk(chunk)
+                    item = self._next_block()
+                    if item is None:
+                        break
+                    out, n, self.current_position = item
+
+                    self._ring_push(out[:n])
+                    # El chunk suena cuando el callback consuma lo que tiene delante en el ring
+                    mark = self._play_mark
+                    if mark is None:
+                        mark = (time.monotonic(), self._ring_read)
+                    play_at = (mark[0] + self._out_latency
+                               + (self._ring_write - n - mark[1]) / self.sample_rate)
+
+                    self._process_audio_chunk(out[:n, 0], play_at)
                     self._print_progress()
                 else:
                     time.sleep(0.1)
 
+            # Fin del fichero: dejar que el callback reproduzca lo que queda en el ring
+            while self.running and self._ring_read < self._ring_write:
+                time.sleep(0.01)
+
         except KeyboardInterrupt:
             pass
         finally:
@@ -327,6 +429,9 @@ class MusicVisualizer:
                 stream.close()
             except:
                 pass
+            # No cerrar el fichero mientras el decodificador pueda estar leyéndolo
+            self._decoder_thread.join(timeout=1.0)
+            self._sf.close()
             print("\033[?25h\n\n✨ Playback stopped.")
 
     def stop(self):
@@ -1,3 +1,4 @@
+import functools
 import requests
 import sys
 
@@ -6,6 +7,27 @@ API_KEY = "5bd0b11fc68375c4757413419c1d156c"
 # Ejemplo: API_KEY = "3b4c5d6e7f8g9h0i..."
 # ---------------------------
 
+API_URL = "https://ws.audioscrobbler.com/2.0/"
+# Sesión HTTP compartida: reutiliza la conexión TLS entre consultas
+SESION_HTTP = requests.Session()
+SESION_HTTP.mount("https://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=4))
+
+
+@functools.lru_cache(maxsize=32)
+def lastfm_track_info(artist, track):
+    """Consulta track.getInfo una sola vez por (artista, canción); devuelve (status, json)."""
+    params = {
+        'method': 'track.getInfo',
+        'api_key': API_KEY,
+        'artist': artist,
+        'track': track,
+        'format': 'json'
+    }
+    # timeout = (conexión, lectura)
+    response = SESION_HTTP.get(API_URL, params=params, timeout=(2, 5))
+    return response.status_code, response.json()
+
+
 print("🔍 PROBANDO CONEXIÓN A LAST.FM...")
 
 if API_KEY == "PEGAR_TU_CLAVE_AQUI" or API_KEY == "TU_API_KEY_AQUI":
@@ -15,19 +37,10 @@ if API_KEY == "PEGAR_TU_CLAVE_AQUI" or API_KEY == "TU_API_KEY_AQUI":
 
 try:
     # Probamos con una canción famosa que seguro existe
-    params = {
-        'method': 'track.getInfo',
-        'api_key': API_KEY,
-        'artist': 'Queen',
-        'track': 'Bohemian Rhapsody',
-        'format': 'json'
-    }
-    
-    response = requests.get("https://ws.audioscrobbler.com/2.0/", params=params, timeout=5)
-    data = response.json()
+    status_code, data = lastfm_track_info('Queen', 'Bohemian Rhapsody')
 
     # Análisis de respuesta
-    if response.status_code == 200 and 'track' in data:
+    if status_code == 200 and 'track' in data:
         print("✅ ¡ÉXITO! Tu API Key funciona perfectamente.")
         print(f"Canción detectada: {data['track']['name']} - {data['track']['artist']['name']}")
         tags = [t['name'] for t in data['track']['toptags']['tag']]
@@ -41,7 +54,7 @@ try:
             print("💡 Pista: Tu API Key es inválida. Copiala de nuevo con cuidado.")
     
     else:
-        print(f"⚠️ Respuesta extraña: {response.status_code}")
+        print(f"⚠️ Respuesta extraña: {status_code}")
         print(data)
 
 except Exception as e:
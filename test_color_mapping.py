@@ -0,0 +1,21 @@
+import numpy as np
+
+from color_mapping import MultiLightMapper, to_color_array
+
+
+def test_to_color_array_empty():
+    for num_lights in (0, 1, 3):
+        colors = to_color_array([], num_lights)
+        assert colors.shape == (num_lights, 4)
+        assert colors.dtype == np.uint8
+        assert not colors.any()
+
+
+def test_to_color_array_no_lights_connected():
+    colors = MultiLightMapper().map_lights(0.5, 0.5, 0.5, num_lights=0)
+    assert to_color_array(colors, 0).shape == (0, 4)
+
+
+def test_to_color_array_single_color_repeated():
+    colors = to_color_array((300, 20, -5, 80), 3)
+    assert colors.tolist() == [[255, 20, 0, 80]] * 3
@@ -0,0 +1,47 @@
+import json
+import socket
+import time
+
+from wiz_control import WizLight
+
+
+def _bulk_receiver():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.settimeout(0.2)
+    WizLight._bulk_last.clear()
+    return sock, sock.getsockname()[1]
+
+
+def _received(sock):
+    frames = []
+    try:
+        while True:
+            frames.append(json.loads(sock.recv(1024))["params"])
+    except socket.timeout:
+        return frames
+
+
+def test_set_colors_bulk_coalesces_repeated_frames():
+    sock, port = _bulk_receiver()
+    try:
+        assert WizLight.set_colors_bulk([("127.0.0.1", 100, 50, 0, 80)], port) == 1
+        # Same frame, then a 2-unit change, inside min_interval: both coalesced
+        assert WizLight.set_colors_bulk([("127.0.0.1", 100, 50, 0, 80)], port) == 1
+        assert WizLight.set_colors_bulk([("127.0.0.1", 102, 50, 0, 80)], port) == 1
+        # A visible change is always sent
+        assert WizLight.set_colors_bulk([("127.0.0.1", 200, 50, 0, 80)], port) == 1
+        assert [f["r"] for f in _received(sock)] == [100, 200]
+    finally:
+        sock.close()
+
+
+def test_set_colors_bulk_resends_after_min_interval():
+    sock, port = _bulk_receiver()
+    try:
+        WizLight.set_colors_bulk([("127.0.0.1", 10, 20, 30, 50)], port)
+        time.sleep(WizLight.min_interval * 2)
+        WizLight.set_colors_bulk([("127.0.0.1", 10, 20, 30, 50)], port)
+        assert len(_received(sock)) == 2
+    finally:
+        sock.close()
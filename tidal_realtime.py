@@ -5,13 +5,13 @@ TIDAL/SYSTEM REAL-TIME VISUALIZER (WASAPI LOOPBACK)
 
 import soundcard as sc
 import numpy as np
+from scipy.fft import rfft, irfft, rfftfreq
 import time
 import threading
 import queue
 import logging
 import warnings
 import sys
-from concurrent.futures import ThreadPoolExecutor
 from flask import Flask, request, make_response
 from i18n_manager import t
 
@@ -21,9 +21,11 @@ log = logging.getLogger('werkzeug')
 log.setLevel(logging.ERROR)
 
 from wiz_control import WizLight
+from audio_analysis import root_mean_square
 from color_mapping import (
     SpectrumPulseMapper,
-    TurboSpectrumGradient
+    TurboSpectrumGradient,
+    to_color_array,
 )
 
 # --- CONFIGURACIÓN ---
@@ -31,6 +33,7 @@ SAMPLE_RATE = 44100
 CHUNK_SIZE = 4096
 THROTTLE_TIME = 0.035
 SILENCE_THRESHOLD = 0.005 
+CREST_HISTORY = 40  # bloques que promedia el Auto DJ (~3.7 s)
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 logger = logging.getLogger("tidal_realtime")
@@ -69,10 +72,15 @@ def run_server():
 class RealTimeVisualizer:
     def __init__(self, light_ips):
         self.light_ips = light_ips
-        self.lights = [WizLight(ip) for ip in light_ips]
+        # Los frames salen por WizLight.set_colors_bulk: basta con las IPs y cuántas son
+        self.num_lights = len(light_ips)
         
         self.current_mode = "spectrum_gradient"
-        self.crest_factor_history = []
+        # Historial de crest factor: ring de tamaño fijo (escritura O(1), sin pop(0))
+        self._crest_ring = np.zeros(CREST_HISTORY)
+        self._crest_idx = 0
+        self._crest_len = 0
+        self._crest_sum = 0.0  # suma corriente del ring: media O(1)
         self.last_mode_switch = time.time()
         self.is_silent = False 
         
@@ -81,28 +89,51 @@ class RealTimeVisualizer:
             "spectrum_gradient": TurboSpectrumGradient(min_brightness=10, max_brightness=100)
         }
         
-        self._executor = ThreadPoolExecutor(max_workers=len(self.lights))
         self._last_update = 0
+        # Buffer reutilizable para |X| del bloque
+        self._fft_mag = np.empty(CHUNK_SIZE // 2 + 1, dtype=np.float32)
+        # Límites (índices de bin) de las bandas por tamaño de bloque
+        self._band_bounds = {}
+        self._get_band_bounds(CHUNK_SIZE)
         self.running = True
 
-    def _auto_dj_logic(self, audio_chunk):
-        spectrum = np.fft.rfft(audio_chunk)
-        freqs = np.fft.rfftfreq(len(audio_chunk), 1/SAMPLE_RATE)
+    def _get_band_bounds(self, n):
+        # Los bins de la rfft están ordenados por frecuencia: cada banda es un tramo contiguo.
+        # Devuelve (inicio graves >= 20 Hz, fin graves <= 150 Hz, fin medios <= 4000 Hz)
+        bounds = self._band_bounds.get(n)
+        if bounds is None:
+            freqs = rfftfreq(n, 1/SAMPLE_RATE)
+            bounds = (
+                int(np.searchsorted(freqs, 20, side="left")),
+                int(np.searchsorted(freqs, 150, side="right")),
+                int(np.searchsorted(freqs, 4000, side="right")),
+            )
+            self._band_bounds[n] = bounds
+        return bounds
+
+    def _auto_dj_logic(self, spectrum, n):
+        # Recibe el espectro ya calculado del bloque de n muestras
+        _, bass_hi, _ = self._get_band_bounds(n)
         
-        bass_spectrum = np.copy(spectrum)
-        bass_spectrum[freqs > 150] = 0
-        bass_waveform = np.fft.irfft(bass_spectrum)
+        # Paso-bajo ideal a 150 Hz: irfft con n rellena con ceros los bins que faltan,
+        # así que basta con pasarle la vista de los graves (sin copia ni máscara)
+        bass_waveform = irfft(spectrum[:bass_hi], n, workers=1)
         
         peak = np.max(np.abs(bass_waveform))
-        rms = np.sqrt(np.mean(bass_waveform**2))
+        rms = root_mean_square(bass_waveform)
         crest = peak / (rms + 0.0001)
         
-        self.crest_factor_history.append(crest)
-        if len(self.crest_factor_history) > 40:
-            self.crest_factor_history.pop(0)
+        # Entra el nuevo valor y sale el que ocupaba su hueco (0 mientras se llena)
+        self._crest_sum += crest - self._crest_ring[self._crest_idx]
+        self._crest_ring[self._crest_idx] = crest
+        self._crest_idx = (self._crest_idx + 1) % CREST_HISTORY
+        self._crest_len = min(self._crest_len + 1, CREST_HISTORY)
+        if self._crest_idx == 0:
+            # Una vez por vuelta se recalcula la suma para no acumular error de redondeo
+            self._crest_sum = float(self._crest_ring.sum())
             
         if time.time() - self.last_mode_switch > 3.0:
-            avg_crest = sum(self.crest_factor_history) / len(self.crest_factor_history)
+            avg_crest = self._crest_sum / self._crest_len
             
             new_mode = self.current_mode
             if avg_crest > 3.0: 
@@ -118,7 +149,7 @@ class RealTimeVisualizer:
 
     def _process_audio(self, audio_chunk):
         mono_chunk = np.mean(audio_chunk, axis=1)
-        rms_amplitude = np.sqrt(np.mean(mono_chunk**2))
+        rms_amplitude = root_mean_square(mono_chunk)
         
         if rms_amplitude < SILENCE_THRESHOLD:
             if not self.is_silent:
@@ -127,14 +158,19 @@ class RealTimeVisualizer:
             return
         
         self.is_silent = False 
-        self._auto_dj_logic(mono_chunk)
+        # Una sola FFT por bloque: la comparten el Auto DJ y las bandas
+        # (scipy.fft reutiliza su plan en caché para el tamaño fijo de bloque)
+        spectrum = rfft(mono_chunk, workers=1)
+        self._auto_dj_logic(spectrum, len(mono_chunk))
         
-        fft_data = np.abs(np.fft.rfft(mono_chunk))
-        freqs = np.fft.rfftfreq(len(mono_chunk), 1/SAMPLE_RATE)
+        if self._fft_mag.size != spectrum.size:
+            self._fft_mag = np.empty(spectrum.size, dtype=np.float32)
+        fft_data = np.abs(spectrum, out=self._fft_mag)
+        bass_lo, bass_hi, mids_hi = self._get_band_bounds(len(mono_chunk))
         
-        bass = np.sum(fft_data[np.where((freqs >= 20) & (freqs <= 150))])
-        mids = np.sum(fft_data[np.where((freqs > 150) & (freqs <= 4000))])
-        treble = np.sum(fft_data[np.where((freqs > 4000))])
+        bass = np.sum(fft_data[bass_lo:bass_hi])
+        mids = np.sum(fft_data[bass_hi:mids_hi])
+        treble = np.sum(fft_data[mids_hi:])
         
         scale = 1.0 / (np.max(fft_data) + 10) 
         b_val = min(bass * scale * 2.0, 1.0)
@@ -145,7 +181,7 @@ class RealTimeVisualizer:
         mapper = self.mappers.get(self.current_mode, self.mappers["spectrum_gradient"])
         
         if hasattr(mapper, "map_lights"):
-            colors = mapper.map_lights(b_val, m_val, t_val, len(self.lights))
+            colors = mapper.map_lights(b_val, m_val, t_val, self.num_lights)
         else:
             colors = mapper.map(b_val, m_val, t_val, amp_val)
             
@@ -155,19 +191,12 @@ class RealTimeVisualizer:
             self._last_update = now
 
     def _send_colors(self, colors):
-        def send(light, c):
-            try:
-                if isinstance(c, (list, tuple)) and len(c) == 4:
-                    light.set_color(*c)
-            except: pass
-
-        if isinstance(colors, list) and len(colors) == len(self.lights):
-            for i, light in enumerate(self.lights):
-                self._executor.submit(send, light, colors[i])
-        else:
-            c = colors[0] if isinstance(colors, list) else colors
-            for light in self.lights:
-                self._executor.submit(send, light, c)
+        # Una fila (r, g, b, brillo) uint8 por luz, sea cual sea la forma que devuelve el mapper
+        # UDP fire & forget: sendto no bloquea, así que enviamos seguido sin hilos
+        WizLight.set_colors_bulk(
+            (ip, r, g, b, bri)
+            for ip, (r, g, b, bri) in zip(self.light_ips, to_color_array(colors, self.num_lights).tolist())
+        )
 
     def start(self):
         try:
@@ -197,7 +226,6 @@ class RealTimeVisualizer:
 
     def stop(self):
         self.running = False
-        self._executor.shutdown(wait=False)
         print(t("system_stopped"))
 
 def discover_lights():
@@ -1,13 +1,155 @@
 #!/usr/bin/env python3
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import select
 import socket
 import json
 import sys
+import time
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, the stdlib json module is used instead
+    orjson = None
+
+if orjson is not None:
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+else:
+    def _dumps(obj):
+        """json.dumps to UTF-8 bytes (orjson.dumps signature)"""
+        return json.dumps(obj).encode()
+
+    def _loads(data):
+        """json.loads of UTF-8 bytes or a memoryview over them (orjson.loads signature)"""
+        return json.loads(bytes(data))
+
+
+def _dimming(brightness):
+    """Map a 0-100 or 0-255 brightness to the Wiz dimming range (10-100)"""
+    # Wiz usa dimming 10-100. Si viene en 255, lo normalizamos.
+    if brightness > 100:
+        brightness = int((brightness / 255) * 100)
+
+    # Seguridad para tus Wiz 8.5W
+    return max(10, min(100, int(brightness)))
+
+
+# _dimming precomputed for integer brightness 0-511
+_DIMMING = bytes(_dimming(v) for v in range(512))
+
+# Kernel send buffer for the Wiz sockets: frame bursts to several lights must not block
+SEND_BUFFER = 1 << 20
+
+
+def _enlarge_send_buffer(sock):
+    """Ask for a SEND_BUFFER-byte SO_SNDBUF (the kernel may cap it, see net.core.wmem_max)"""
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER)
+    except OSError:
+        pass
+
+
+class _WizResponseProtocol(asyncio.DatagramProtocol):
+    """Resolves a future with the first datagram received from the light."""
+
+    def __init__(self, future):
+        self.future = future
+
+    def datagram_received(self, data, addr):
+        if not self.future.done():
+            self.future.set_result(data)
+
+    def error_received(self, exc):
+        if not self.future.done():
+            self.future.set_exception(exc)
+
+
+def _coalesced(last, values, now, min_interval, delta_thresh):
+    """True if a setPilot can be skipped: last = (values, time) sent too recently and too close"""
+    return (last is not None and now - last[1] < min_interval
+            and max(abs(v - lv) for v, lv in zip(values, last[0])) < delta_thresh)
 
 
 class WizLight:
+    # setPilot coalescing: frames closer than delta_thresh (per value) to the last one
+    # sent to the same light, within min_interval seconds, are not sent
+    min_interval = 1 / 60
+    delta_thresh = 4
+
     def __init__(self, ip=None):
         self.ip = ip
         self.port = 38899
+        self._sock = None
+        self._poller = None
+        # Replies are received into this buffer instead of a new bytes object each time
+        self._recv_buf = bytearray(2048)
+        self._recv_view = memoryview(self._recv_buf)
+        # (values, time.monotonic()) of the last setPilot sent by set_color
+        self._last_pilot = None
+
+    def _socket(self):
+        """UDP socket reused by every command of this light (created on first use)"""
+        if self._sock is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            try:
+                if self.ip:
+                    # Resolve and connect() once: send() skips per-packet address parsing,
+                    # and the kernel only delivers datagrams coming from this light
+                    sock.connect((socket.gethostbyname(self.ip), self.port))
+                else:
+                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+            except OSError:
+                sock.close()
+                raise
+            _enlarge_send_buffer(sock)
+            # Non-blocking: replies are awaited with poll() instead of settimeout() + recv()
+            sock.setblocking(False)
+            if hasattr(select, "poll"):
+                self._poller = select.poll()
+                self._poller.register(sock, select.POLLIN)
+            self._sock = sock
+        return self._sock
+
+    def _wait_readable(self, sock, timeout):
+        """Wait up to timeout seconds for a datagram (select() where poll() is missing)"""
+        if self._poller is not None:
+            return bool(self._poller.poll(timeout * 1000))
+        return bool(select.select([sock], [], [], timeout)[0])
+
+    def _drain(self, sock):
+        """Drop datagrams still queued on the socket (replies to fire & forget commands)"""
+        try:
+            while True:
+                sock.recv_into(self._recv_buf)
+        except OSError:
+            pass
+
+    def close(self):
+        """Close the cached socket (a new one is opened on the next command)"""
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+            self._poller = None
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def _send_nowait(self, sock, json_command):
+        """Fire & forget send on the connected socket (False if the frame was dropped)"""
+        # This path is syscall-bound: one send() per frame, the Python side is a bytes format
+        try:
+            sock.send(json_command)
+        except ConnectionRefusedError:
+            # ICMP "port unreachable" de un envío anterior: ya se ha consumido, reintentar
+            sock.send(json_command)
+        except BlockingIOError:
+            # Buffer de envío lleno: se descarta el frame en vez de bloquear
+            return False
+        return True
 
     def send_command(self, method, params=None, wait_for_response=True):
         """
@@ -22,45 +164,58 @@ class WizLight:
             params = {}
 
         message = {"id": 1, "method": method, "params": params}
-        json_command = json.dumps(message).encode()
+        return self._send(_dumps(message), method, wait_for_response)
 
-        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        
-        try:
-            if self.ip:
-                # Send to specific light
-                sock.sendto(json_command, (self.ip, self.port))
-                
-                if wait_for_response:
-                    sock.settimeout(0.5) # Timeout optimizado para Wiz 8.5W
-                    try:
-                        response, _ = sock.recvfrom(1024)
-                        return json.loads(response.decode())
-                    except socket.timeout:
-                        return {"error": "Timeout waiting for light"}
-                    except Exception as e:
-                        return {"error": str(e)}
-                else:
-                    # Modo "Music Visualizer": No esperamos respuesta para reducir LAG en 2.4GHz
-                    return {"success": True, "info": "Command sent (no wait)"}
-            else:
-                # Broadcast (Discover) - Siempre necesita respuesta
-                sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-                sock.sendto(json_command, ("255.255.255.255", self.port))
-
-                lights = []
-                sock.settimeout(2.0)
-                while True:
-                    try:
-                        response, addr = sock.recvfrom(1024)
-                        resp_json = json.loads(response.decode())
-                        if not any(l['ip'] == addr[0] for l in lights):
-                            lights.append({"ip": addr[0], "response": resp_json})
-                    except socket.timeout:
-                        break
-                return lights
-        finally:
-            sock.close()
+    def _send(self, json_command, method, wait_for_response=True):
+        """Send an already encoded command (see send_command)"""
+        if self.ip and not wait_for_response:
+            # Modo "Music Visualizer": No esperamos respuesta para reducir LAG en 2.4GHz
+            if self._send_nowait(self._socket(), json_command):
+                return {"success": True, "info": "Command sent (no wait)"}
+            return {"error": "Send buffer full, frame dropped"}
+
+        sock = self._socket()
+
+        if self.ip:
+
+            # El socket se reutiliza: descartar respuestas pendientes de envíos anteriores
+            self._drain(sock)
+            sock.send(json_command)
+
+            deadline = time.monotonic() + 0.5 # Timeout optimizado para Wiz 8.5W
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return {"error": "Timeout waiting for light"}
+                if not self._wait_readable(sock, remaining):
+                    return {"error": "Timeout waiting for light"}
+                try:
+                    resp_json = _loads(self._recv_view[:sock.recv_into(self._recv_buf)])
+                except BlockingIOError:
+                    continue
+                except Exception as e:
+                    return {"error": str(e)}
+                # Ignorar respuestas atrasadas a otro comando (p. ej. un setPilot en vuelo)
+                if resp_json.get("method", method) == method:
+                    return resp_json
+        else:
+            # Broadcast (Discover) - Siempre necesita respuesta
+            self._drain(sock)
+            sock.sendto(json_command, ("255.255.255.255", self.port))
+
+            lights = []
+            seen_ips = set()
+            # Se escucha hasta 2s sin recibir ninguna respuesta nueva
+            while self._wait_readable(sock, 2.0):
+                try:
+                    nbytes, addr = sock.recvfrom_into(self._recv_buf)
+                except BlockingIOError:
+                    continue
+                # Respuestas repetidas de la misma luz: ni se parsean
+                if addr[0] not in seen_ips:
+                    seen_ips.add(addr[0])
+                    lights.append({"ip": addr[0], "response": _loads(self._recv_view[:nbytes])})
+            return lights
 
     def discover(self):
         """Discover lights on network"""
@@ -70,32 +225,142 @@ class WizLight:
         """Get current state of light"""
         return self.send_command("getPilot")
 
+    # setState on/off pre-encoded, indexed by bool(state)
+    _SETSTATE = (
+        b'{"id": 1, "method": "setState", "params": {"state": false}}',
+        b'{"id": 1, "method": "setState", "params": {"state": true}}',
+    )
+
     def set_state(self, state):
         """Turn light on/off"""
-        return self.send_command("setState", {"state": state})
+        return self._send(self._SETSTATE[bool(state)], "setState")
+
+    # setPilot pre-encoded: the same bytes json.dumps produces, without the dict or the encoder
+    _SETPILOT_TMPL = b'{"id": 1, "method": "setPilot", "params": {"r": %d, "g": %d, "b": %d, "dimming": %d}}'
 
     def set_color(self, r, g, b, brightness=100):
         """
         Set light color and brightness.
         AUTOMÁTICAMENTE EN MODO RÁPIDO (FIRE & FORGET)
         """
-        # Wiz usa dimming 10-100. Si viene en 255, lo normalizamos.
-        if brightness > 100:
-            brightness = int((brightness / 255) * 100)
-        
-        # Seguridad para tus Wiz 8.5W
-        brightness = max(10, min(100, int(brightness)))
+        values = self._color_values(r, g, b, brightness)
+        now = time.monotonic()
+        # Cambios de 1-2 unidades no se ven en la bombilla: no gastamos un paquete en ellos
+        if _coalesced(self._last_pilot, values, now, self.min_interval, self.delta_thresh):
+            return {"success": True, "info": "coalesced"}
+        self._last_pilot = (values, now)
+
+        # Aquí está la magia: wait_for_response=False
+        return self._send(self._SETPILOT_TMPL % values, "setPilot", wait_for_response=False)
+
+    # Socket shared by set_colors_bulk, and the last (values, time) it sent per IP
+    _bulk_sock = None
+    _bulk_last = {}
+
+    @classmethod
+    def set_colors_bulk(cls, updates, port=38899):
+        """
+        Send one frame of setPilot updates to several lights, fire & forget.
+        Updates coalesced with the last one sent to that IP are skipped (see min_interval).
+
+        Args:
+            updates: iterable of (ip, r, g, b, brightness)
+            port (int): Wiz UDP port
+
+        Returns:
+            int: number of updates sent or coalesced (the rest failed to send)
+        """
+        if cls._bulk_sock is None:
+            cls._bulk_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            _enlarge_send_buffer(cls._bulk_sock)
+        sendto = cls._bulk_sock.sendto
+        tmpl = cls._SETPILOT_TMPL
+        color_values = cls._color_values
+        last_sent = cls._bulk_last
+        min_interval = cls.min_interval
+        delta_thresh = cls.delta_thresh
+        now = time.monotonic()
+
+        handled = 0
+        for ip, r, g, b, brightness in updates:
+            values = color_values(r, g, b, brightness)
+            if not _coalesced(last_sent.get(ip), values, now, min_interval, delta_thresh):
+                try:
+                    sendto(tmpl % values, (ip, port))
+                except OSError:
+                    continue
+                last_sent[ip] = (values, now)
+            handled += 1
+        return handled
+
+    @staticmethod
+    def _color_values(r, g, b, brightness):
+        """Clamp color/brightness into setPilot (r, g, b, dimming) ints"""
+        try:
+            # Caso habitual (brillo entero 0-511): una sola consulta a la tabla
+            brightness = _DIMMING[brightness] if brightness >= 0 else 10
+        except (IndexError, TypeError):
+            brightness = _dimming(brightness)
         r = max(0, min(255, int(r)))
         g = max(0, min(255, int(g)))
         b = max(0, min(255, int(b)))
+        return r, g, b, brightness
 
-        # Aquí está la magia: wait_for_response=False
-        return self.send_command(
-            "setPilot", 
-            {"r": r, "g": g, "b": b, "dimming": brightness},
-            wait_for_response=False 
+    async def send_command_async(self, method, params=None, wait_for_response=True, retries=3):
+        """
+        Send UDP command to a specific light without blocking the event loop.
+
+        Args:
+            method (str): The Wiz API method (e.g., setPilot)
+            params (dict): Parameters for the method
+            wait_for_response (bool): If False, sends "fire & forget"
+            retries (int): Datagrams sent (within the 0.5s timeout) before giving up
+        """
+        if params is None:
+            params = {}
+
+        message = {"id": 1, "method": method, "params": params}
+        return await self._send_async(_dumps(message), wait_for_response, retries)
+
+    async def _send_async(self, json_command, wait_for_response=True, retries=3):
+        """Send an already encoded command (see send_command_async)"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: _WizResponseProtocol(future), remote_addr=(self.ip, self.port)
         )
+        try:
+            if not wait_for_response:
+                transport.sendto(json_command)
+                return {"success": True, "info": "Command sent (no wait)"}
+
+            # UDP puede perder paquetes: retransmitimos dentro del mismo timeout
+            for _ in range(retries):
+                transport.sendto(json_command)
+                try:
+                    response = await asyncio.wait_for(asyncio.shield(future), 0.5 / retries)
+                    return _loads(response)
+                except asyncio.TimeoutError:
+                    continue
+                except Exception as e:
+                    return {"error": str(e)}
+            return {"error": "Timeout waiting for light"}
+        finally:
+            transport.close()
 
+    async def get_state_async(self):
+        """Get current state of light (async)"""
+        return await self.send_command_async("getPilot")
+
+    async def set_state_async(self, state):
+        """Turn light on/off (async)"""
+        return await self._send_async(self._SETSTATE[bool(state)])
+
+    async def set_color_async(self, r, g, b, brightness=100):
+        """Set light color and brightness (async, fire & forget)"""
+        return await self._send_async(
+            self._SETPILOT_TMPL % self._color_values(r, g, b, brightness), wait_for_response=False
+        )
 
 def print_usage():
     print("""
@@ -107,6 +372,7 @@ Commands:
     on <ip>           - Turn light on
     off <ip>          - Turn light off
     color <ip> r g b  - Set light color (0-255 for each value)
+    broadcast-color r g b - Set the color of every discovered light
     """)
 
 
@@ -149,6 +415,19 @@ def main():
         # En modo manual sí esperamos respuesta para ver el JSON
         print(json.dumps(light.set_color(r, g, b), indent=2))
 
+    elif command == "broadcast-color" and len(sys.argv) == 5:
+        r = int(sys.argv[2])
+        g = int(sys.argv[3])
+        b = int(sys.argv[4])
+        ips = [found["ip"] for found in WizLight().discover()]
+        # Un WizLight (y su socket) por luz, enviados en paralelo
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            results = executor.map(lambda ip: WizLight(ip).set_color(r, g, b), ips)
+            for ip, result in zip(ips, results):
+                print(f"{ip}: {json.dumps(result)}")
+        if not ips:
+            print("No lights found")
+
     else:
         print_usage()
 